@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# Synthetic scqueryqc output for benchmarks.
+#
+# Emits the XML scqueryqc writes (seiscomp3-schema 0.12 or 0.13) for
+# N streams x M parameters x T hours of 10-minute QC reports, with values
+# drawn from rough per-parameter distributions. Output is produced in
+# chunks so large documents never have to be held in memory.
+#
+#   ./qcsynth.py --streams 200 --hours 24 > qc.xml
+
+import argparse
+import datetime
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qcfetch import QC_PARAMETERS  # noqa: E402
+
+SCHEMA_VERSIONS = ['0.12', '0.13']
+NAMESPACE = "http://geofon.gfz-potsdam.de/ns/seiscomp3-schema/{version}"
+NETWORKS = ['AU', 'GE', 'IU', 'II', 'S1', 'G', 'NZ', 'IA']
+CHANNELS = ['BHZ', 'HHZ', 'SHZ', 'EHZ']
+
+
+def parameter_values(parameter, count, rng):
+    if parameter in ('latency', 'delay'):
+        return rng.lognormal(1.0, 0.8, count)
+    if parameter == 'availability':
+        return np.clip(100 - rng.exponential(0.5, count) * (rng.random(count) < 0.1) * 40, 0, 100)
+    if parameter == 'timing':
+        return np.clip(100 - rng.exponential(2, count), 0, 100)
+    if parameter in ('offset', 'rms'):
+        return rng.normal(0 if parameter == 'offset' else 500, 50, count)
+    if parameter.endswith('count'):
+        return rng.poisson(0.3, count).astype(np.float64)
+    return rng.exponential(1.0, count)
+
+
+def stream_ids(n_streams):
+    streams = []
+    for index in range(n_streams):
+        network = NETWORKS[index % len(NETWORKS)]
+        station = f"S{index // len(NETWORKS):04d}"
+        location = '' if index % 3 else '00'
+        streams.append((network, station, location, CHANNELS[index % len(CHANNELS)]))
+    return streams
+
+
+def synthetic_xml(n_streams, parameters, hours, version='0.13', interval=600, seed=0,
+                  start=datetime.datetime(2024, 1, 1)):
+    # Yields the document as bytes chunks, one chunk per report window
+    rng = np.random.default_rng(seed)
+    namespace = NAMESPACE.format(version=version)
+    streams = stream_ids(n_streams)
+    n_windows = int(hours * 3600 // interval)
+    values = {parameter: parameter_values(parameter, n_windows * len(streams), rng).reshape(n_windows, -1)
+              for parameter in parameters}
+
+    yield (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+           f'<seiscomp xmlns="{namespace}" version="{version}">\n'
+           f'  <QualityControl>\n').encode()
+    for window in range(n_windows):
+        window_start = start + datetime.timedelta(seconds=window * interval)
+        window_end = window_start + datetime.timedelta(seconds=interval)
+        begin = window_start.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        end = window_end.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        parts = []
+        for stream_index, (network, station, location, channel) in enumerate(streams):
+            for parameter in parameters:
+                parts.append(
+                    f'    <waveformQuality>\n'
+                    f'      <waveformID networkCode="{network}" stationCode="{station}" '
+                    f'locationCode="{location}" channelCode="{channel}"/>\n'
+                    f'      <creatorID>scqc@synthetic</creatorID>\n'
+                    f'      <created>{end}</created>\n'
+                    f'      <start>{begin}</start>\n'
+                    f'      <end>{end}</end>\n'
+                    f'      <type>report</type>\n'
+                    f'      <parameter>{parameter}</parameter>\n'
+                    f'      <value>{values[parameter][window, stream_index]:.6g}</value>\n'
+                    f'      <windowLength>{interval}</windowLength>\n'
+                    f'    </waveformQuality>\n'
+                )
+        yield ''.join(parts).encode()
+    yield b'  </QualityControl>\n</seiscomp>\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic scqueryqc XML to stdout.")
+    parser.add_argument('--streams', type=int, default=50)
+    parser.add_argument('--parameters', type=int, default=len(QC_PARAMETERS),
+                        help="Number of QC parameters, taken from the start of the standard list")
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--schema', choices=SCHEMA_VERSIONS, default='0.13')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    out = sys.stdout.buffer
+    for chunk in synthetic_xml(args.streams, QC_PARAMETERS[:args.parameters], args.hours, args.schema,
+                               seed=args.seed):
+        out.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
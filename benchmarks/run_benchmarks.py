@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+
+# Headless benchmarks for the parse, aggregate, export and plot paths.
+#
+# Synthetic scqueryqc XML (see qcsynth) is parsed the way ScQueryQCBackend
+# does it, then every stage runs on the resulting store and
+# is timed. Plots are drawn by the visualizer's own TimeSeriesPlot and the
+# qcrender figure functions on an Agg canvas, so no display is needed.
+# Results go to a JSON file; pass an earlier file with --compare to print
+# the speed-up or slow-down of every stage.
+#
+# With --database, the query layer is timed too against a SQLite stand-in
+# made by seiscompdb.py: inventory load, plain and sharded fetches of the
+# first --hours of QC data, cold and warm cache fetches and averaging.
+#
+#   ./run_benchmarks.py --streams 200 --hours 24 --output results.json
+#   ./run_benchmarks.py --output new.json --compare results.json
+#   ./seiscompdb.py /tmp/seiscomp.sqlite && ./run_benchmarks.py --database /tmp/seiscomp.sqlite
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.dates as mdates  # noqa: E402
+import numpy as np  # noqa: E402
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from qccache import QCCache  # noqa: E402
+from qcdb import ConnectionPool  # noqa: E402
+from qcexport import series_chunks  # noqa: E402
+from qcfetch import QC_PARAMETERS, ScQueryQCParser, ShardedBackend, WaveformQualityBackend  # noqa: E402
+from qcinventory import InventoryIndex, build_stream_patterns  # noqa: E402
+from qcrender import (  # noqa: E402
+    decimate, distribution_summaries, draw_distributions, draw_heatmaps, heatmap_layers
+)
+from qcreport import station_averages  # noqa: E402
+from qcstore import QCSeriesStore, ns_to_datetime64, ns_to_query_time, query_time_to_ns  # noqa: E402
+from qcsynth import SCHEMA_VERSIONS, synthetic_xml  # noqa: E402
+
+PIXELS = 1400
+HEIGHT = 900
+
+application = None
+READ_SIZE = 65536
+
+
+def parse_xml(document, parameters):
+    # Same steps as ScQueryQCBackend, fed in scqueryqc-sized reads
+    parser = ScQueryQCParser(parameters)
+    store = QCSeriesStore()
+    for begin in range(0, len(document), READ_SIZE):
+        store.append_records(parser.feed(document[begin:begin + READ_SIZE]))
+    store.append_records(parser.close())
+    store.compact()
+    return store
+
+
+def load_visualizer():
+    # The GUI script's name is not importable; its Qt5Agg backend choice is
+    # undone, since only Agg canvases are drawn here
+    spec = importlib.util.spec_from_file_location('visualizer', os.path.join(REPO, 'qc-visualizer-from-databasev6.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    matplotlib.use('Agg')
+    # The zoom decimator's timers need an application object, but no event
+    # loop runs, so only the synchronous drawing is timed
+    global application
+    application = QCoreApplication.instance() or QCoreApplication([])
+    return module
+
+
+def plot_series(store, method):
+    series = []
+    for _, _, times_ns, values in store.items():
+        times = mdates.date2num(ns_to_datetime64(times_ns))
+        series.append(decimate(times, values, PIXELS, method))
+    return series
+
+
+def render_time_series(visualizer, store, batched):
+    # SeisCompGUI.plot_time_series with the default min-max downsampling
+    plot = visualizer.TimeSeriesPlot('line', PIXELS, HEIGHT, False, False, 'min-max', batched, True,
+                                     canvas_class=FigureCanvasAgg)
+    plot.add_store(store)
+    plot.add_hover()
+    plot.fig.tight_layout()
+    plot.canvas.draw()
+
+
+def new_figure():
+    fig = Figure(figsize=(PIXELS / 100, HEIGHT / 100))
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def render_heatmap(store):
+    # SeisCompGUI.plot_heatmap
+    fig = new_figure()
+    draw_heatmaps(fig, heatmap_layers(store, PIXELS // 2), 'mean', False, False)
+    fig.tight_layout()
+    fig.canvas.draw()
+
+
+def render_distribution(store, plot_type):
+    # SeisCompGUI.plot_distribution
+    fig = new_figure()
+    draw_distributions(fig, distribution_summaries(store), plot_type, False, False)
+    fig.tight_layout()
+    fig.canvas.draw()
+
+
+def fetch_store(backend, stream_patterns, parameters, start_time, end_time):
+    store = QCSeriesStore()
+    for batch in backend.fetch_batches(stream_patterns, parameters, start_time, end_time):
+        store.append_batch(batch)
+    return store
+
+
+def cached_fetch(backend, stream_patterns, parameters, start_time, end_time, path):
+    store = QCSeriesStore()
+    QCCache(path).fetch_into(store, backend, stream_patterns, parameters, start_time, end_time)
+    return store
+
+
+def cold_cached_fetch(backend, stream_patterns, parameters, start_time, end_time):
+    with tempfile.TemporaryDirectory() as directory:
+        return cached_fetch(backend, stream_patterns, parameters, start_time, end_time,
+                            os.path.join(directory, 'cache.sqlite'))
+
+
+def database_benchmarks(path, parameters, hours, directory):
+    # Query layer stages against a SQLite stand-in; returns (name, function)
+    # pairs plus the number of rows in the fetched range
+    pool = ConnectionPool(size=10, config={'sqlite': path})
+    inventory = InventoryIndex(pool, ttl=float('inf'))
+    inventory.load()
+    first = pool.execute("SELECT start FROM WaveformQuality ORDER BY start LIMIT 1")[0][0]
+    start_time = first.strftime("%Y-%m-%d %H:%M:%S")
+    end_time = ns_to_query_time(query_time_to_ns(start_time) + int(hours * 3600) * 10**9)
+    stations = inventory.active_stations(inventory.networks(), start_time, end_time)
+    networks = sorted({network for network, _ in stations})
+    stream_patterns = sorted(build_stream_patterns(networks, [station for _, station in stations], [], [],
+                                                   inventory.default_channels()))
+    backend = WaveformQualityBackend(pool=pool)
+    sharded = ShardedBackend(WaveformQualityBackend(pool=pool), 8)
+    warm_path = os.path.join(directory, 'warm_cache.sqlite')
+    rows = len(cached_fetch(backend, stream_patterns, parameters, start_time, end_time, warm_path))
+    args = (stream_patterns, parameters, start_time, end_time)
+
+    return [
+        ('db_inventory_load', inventory.load),
+        ('db_fetch', lambda: fetch_store(backend, *args)),
+        ('db_fetch_sharded', lambda: fetch_store(sharded, *args)),
+        ('db_cache_cold', lambda: cold_cached_fetch(backend, *args)),
+        ('db_cache_warm', lambda: cached_fetch(backend, *args, warm_path)),
+        ('db_averages', lambda: station_averages(fetch_store(backend, *args), stations)),
+    ], rows
+
+
+def time_call(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return {'min': min(timings), 'median': statistics.median(timings), 'repeat': repeat}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    parameters = QC_PARAMETERS[:args.parameters]
+    results = {}
+
+    started = time.perf_counter()
+    document = b''.join(synthetic_xml(args.streams, parameters, args.hours, args.schema))
+    elapsed = time.perf_counter() - started
+    results['generate_xml'] = {'min': elapsed, 'median': elapsed, 'repeat': 1}
+    store = parse_xml(document, parameters)
+    stations = sorted({tuple(key.split('.')[:2]) for key in store.streams()})
+    visualizer = load_visualizer()
+
+    benchmarks = [
+        ('parse_xml', lambda: parse_xml(document, parameters)),
+        ('station_averages', lambda: station_averages(store, stations)),
+        ('dataframe', lambda: list(series_chunks(store))),
+        ('decimate_minmax', lambda: plot_series(store, 'min-max')),
+        ('decimate_lttb', lambda: plot_series(store, 'LTTB')),
+        ('render_line', lambda: render_time_series(visualizer, store, False)),
+        ('render_batched', lambda: render_time_series(visualizer, store, True)),
+        ('render_heatmap', lambda: render_heatmap(store)),
+        ('render_box', lambda: render_distribution(store, 'box')),
+        ('render_violin', lambda: render_distribution(store, 'violin')),
+    ]
+    directory = tempfile.TemporaryDirectory()
+    database_rows = None
+    if args.database:
+        database_stages, database_rows = database_benchmarks(args.database, parameters, args.hours, directory.name)
+        benchmarks.extend(database_stages)
+    for name, function in benchmarks:
+        if args.only and name not in args.only:
+            continue
+        results[name] = time_call(function, args.repeat)
+        print(f"{name:20s} {results[name]['median'] * 1000:10.1f} ms")
+    directory.cleanup()
+
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'matplotlib': matplotlib.__version__,
+            'machine': platform.machine(),
+            'streams': args.streams,
+            'parameters': len(parameters),
+            'hours': args.hours,
+            'schema': args.schema,
+            'records': len(store),
+            'xml_bytes': len(document),
+            'database': args.database,
+            'database_rows': database_rows,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+    print(f"\n{'stage':20s} {'baseline':>10s} {'current':>10s} {'speed-up':>9s}")
+    for name, result in report['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if old is None:
+            continue
+        print(f"{name:20s} {old['median'] * 1000:8.1f}ms {result['median'] * 1000:8.1f}ms "
+              f"{old['median'] / max(result['median'], 1e-9):8.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark parsing, aggregation and plotting of QC data.")
+    parser.add_argument('--streams', type=int, default=100)
+    parser.add_argument('--parameters', type=int, default=3,
+                        help="Number of QC parameters, taken from the start of the standard list")
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--schema', choices=SCHEMA_VERSIONS, default='0.13')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='*', help="Run only these stages")
+    parser.add_argument('--database', help="SQLite stand-in (see seiscompdb.py) for the query layer stages")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+# Synthetic SeisComP database for load tests without a SeisComP install.
+#
+# Creates a qcsqlite stand-in with N stations spread over networks of about
+# 100 stations each, three-component streams on one or two locations, trunk
+# bindings with detecStream/detecLocid for most stations, a few closed
+# station epochs, and QC reports for the bound stream of every open station
+# over the requested period.
+#
+#   ./seiscompdb.py seiscomp.sqlite --stations 5000 --days 365 --interval 3600
+#   QC_SQLITE_DATABASE=seiscomp.sqlite ../qcreport.py -o averages.csv \
+#       --start "2024-01-01 00:00:00" --end "2024-02-01 00:00:00"
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qcfetch import QC_PARAMETERS  # noqa: E402
+from qcsqlite import create_database, create_indexes, to_sqlite_time  # noqa: E402
+from qcsynth import parameter_values  # noqa: E402
+
+INVENTORY_START = datetime.datetime(2000, 1, 1)
+STATIONS_PER_NETWORK = 100
+BANDS = ['BH', 'HH', 'SH', 'EH']
+
+
+def network_code(index):
+    return chr(ord('A') + index // 26 % 26) + chr(ord('A') + index % 26)
+
+
+def synthetic_inventory(n_stations, qc_start, seed=0):
+    # Yields (network, station, location, band, start, end, bound) per
+    # station; end is set for the few stations closed before qc_start
+    rng = np.random.default_rng(seed)
+    n_networks = max(n_stations // STATIONS_PER_NETWORK, 1)
+    start_days = rng.integers(0, (qc_start - INVENTORY_START).days, n_stations)
+    for index in range(n_stations):
+        start = INVENTORY_START + datetime.timedelta(days=int(start_days[index]))
+        end = None
+        if index % 50 == 49:
+            end = start + (qc_start - start) / 2
+        yield (network_code(index % n_networks), f"S{index // n_networks:04d}", '' if index % 3 else '00',
+               BANDS[index % len(BANDS)], start, end, index % 20 != 19)
+
+
+class OidCounter:
+    # SeisComP takes _oid values for all tables from one sequence
+    def __init__(self):
+        self.value = 0
+
+    def next(self):
+        self.value += 1
+        return self.value
+
+
+def write_inventory(connection, stations, modified):
+    oids = OidCounter()
+    inventory_oid = oids.next()
+    config_oid = oids.next()
+    trunk_oid = oids.next()
+    connection.execute("INSERT INTO ConfigModule VALUES (?, ?, ?, 'trunk', NULL, 1)",
+                       (trunk_oid, config_oid, modified))
+
+    network_oids = {}
+    for network, station, location, band, start, end, bound in stations:
+        start, end = to_sqlite_time(start), to_sqlite_time(end) if end is not None else None
+        if network not in network_oids:
+            network_oids[network] = oids.next()
+            connection.execute("INSERT INTO Network VALUES (?, ?, ?, ?, ?, NULL, ?)",
+                               (network_oids[network], inventory_oid, modified, network, to_sqlite_time(INVENTORY_START),
+                                f"Synthetic network {network}"))
+        station_oid = oids.next()
+        connection.execute("INSERT INTO Station VALUES (?, ?, ?, ?, ?, ?, 0, 0, 0)",
+                           (station_oid, network_oids[network], modified, station, start, end))
+        # Stations with codes ending in 0 get a second, broadband location
+        locations = [(location, band)] + ([('10', 'HH')] if station.endswith('0') and band != 'HH' else [])
+        for location_code, location_band in locations:
+            location_oid = oids.next()
+            connection.execute("INSERT INTO SensorLocation VALUES (?, ?, ?, ?, ?, ?)",
+                               (location_oid, station_oid, modified, location_code, start, end))
+            for component in 'ZNE':
+                connection.execute("INSERT INTO Stream VALUES (?, ?, ?, ?, ?, ?, 100, 1)",
+                                   (oids.next(), location_oid, modified, location_band + component, start, end))
+
+        if not bound:
+            continue
+        config_station_oid = oids.next()
+        connection.execute("INSERT INTO ConfigStation VALUES (?, ?, ?, ?, ?, 1)",
+                           (config_station_oid, trunk_oid, modified, network, station))
+        parameter_set = f"ParameterSet/trunk/Station/{network}/{station}/default"
+        parameter_set_oid = oids.next()
+        connection.execute("INSERT INTO Setup VALUES (?, ?, ?, 'default', ?, 1)",
+                           (oids.next(), config_station_oid, modified, parameter_set))
+        connection.execute("INSERT INTO PublicObject VALUES (?, ?)", (parameter_set_oid, parameter_set))
+        connection.execute("INSERT INTO Parameter VALUES (?, ?, ?, 'detecStream', ?)",
+                           (oids.next(), parameter_set_oid, modified, band))
+        connection.execute("INSERT INTO Parameter VALUES (?, ?, ?, 'detecLocid', ?)",
+                           (oids.next(), parameter_set_oid, modified, location))
+    return oids.next()
+
+
+def write_reports(connection, streams, parameters, qc_start, days, interval, parent_oid, seed=0, on_progress=None):
+    # One report per stream, parameter and window, inserted in time order
+    # so _oid grows with time as it does on a live system
+    rng = np.random.default_rng(seed)
+    n_windows = int(days * 86400 // interval)
+    query = """
+    INSERT INTO WaveformQuality (
+        _parent_oid, _last_modified, waveformID_networkCode, waveformID_stationCode,
+        waveformID_locationCode, waveformID_channelCode, creatorID, created, created_ms,
+        start, start_ms, end, end_ms, type, parameter, value, windowLength
+    ) VALUES (?, ?, ?, ?, ?, ?, 'scqc@synthetic', ?, 0, ?, 0, ?, 0, 'report', ?, ?, ?)
+    """
+    written = 0
+    for window in range(n_windows):
+        window_start = qc_start + datetime.timedelta(seconds=window * interval)
+        begin = to_sqlite_time(window_start)
+        end = to_sqlite_time(window_start + datetime.timedelta(seconds=interval))
+        rows = []
+        for parameter in parameters:
+            values = parameter_values(parameter, len(streams), rng).tolist()
+            rows.extend((parent_oid, end) + stream + (end, begin, end, parameter, value, interval)
+                        for stream, value in zip(streams, values))
+        connection.executemany(query, rows)
+        written += len(rows)
+        if on_progress is not None:
+            on_progress(window + 1, n_windows, written)
+    return written
+
+
+def fill_database(path, n_stations, days, parameters, interval=600, qc_start=datetime.datetime(2024, 1, 1),
+                  seed=0, on_progress=None):
+    connection = create_database(path)
+    # Bulk load without a journal; indexes are built once at the end
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    modified = to_sqlite_time(datetime.datetime.now(datetime.timezone.utc))
+    stations = list(synthetic_inventory(n_stations, qc_start, seed))
+    quality_control_oid = write_inventory(connection, stations, modified)
+    streams = [(network, station, location, band + 'Z')
+               for network, station, location, band, _, end, _ in stations if end is None]
+    written = write_reports(connection, streams, parameters, qc_start, days, interval, quality_control_oid, seed,
+                            on_progress)
+    connection.commit()
+    create_indexes(connection)
+    connection.close()
+    return len(stations), written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create a SQLite SeisComP stand-in with synthetic data.")
+    parser.add_argument('path', help="Database file to create")
+    parser.add_argument('--stations', type=int, default=5000)
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--interval', type=int, default=3600, help="QC report interval in seconds")
+    parser.add_argument('--parameters', type=int, default=3,
+                        help="Number of QC parameters, taken from the start of the standard list")
+    parser.add_argument('--start', default="2024-01-01 00:00:00", help="Start of the QC data")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--force', action='store_true', help="Replace an existing file")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.path):
+        if not args.force:
+            print(f"{args.path} exists; use --force to replace it", file=sys.stderr)
+            return 1
+        os.remove(args.path)
+
+    started = time.monotonic()
+
+    def report(window, n_windows, written):
+        if window % 100 == 0 or window == n_windows:
+            print(f"\r{window}/{n_windows} windows, {written} rows", end='', flush=True)
+
+    n_stations, written = fill_database(args.path, args.stations, args.days, QC_PARAMETERS[:args.parameters],
+                                        args.interval, datetime.datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S"),
+                                        args.seed, report)
+    print(f"\nWrote {n_stations} stations and {written} QC rows to {args.path} "
+          f"in {time.monotonic() - started:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
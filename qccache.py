@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+# Persistent local cache for QC results.
+#
+# Samples are kept in an SQLite file as one BLOB pair (epoch-ns times,
+# float64 values) per stream, parameter and UTC day. A second table records
+# which time intervals have already been fetched for each requested stream
+# pattern and parameter, so a new query only has to fetch the gaps.
+# Rollups for long time ranges (see qcrollup) are maintained alongside.
+# Every data source (database and QC type, see the backends' source_id)
+# gets its own file next to the configured path, so switching databases
+# never serves samples of another one as already fetched.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from qcfetch import FetchCancelled, is_wildcard
+from qcrollup import RollupStore, choose_resolution, create_rollup_table, load_rollups, write_rollups
+from qcstore import QCSeriesStore, ns_to_query_time, query_time_to_ns
+
+DAY_NS = 86400 * 10**9
+SECOND_NS = 10**9
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'qcparameters', 'qc_cache.sqlite')
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def subtract_intervals(start, end, covered):
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class QCCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, settle_time=3600):
+        self.path = path
+        # QC reports keep arriving for a while; anything newer than
+        # settle_time seconds at fetch time is not treated as final and
+        # will be fetched again next time.
+        self.settle_time = settle_time
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Source files whose tables exist
+        self.ready = set()
+        self.lock = threading.Lock()
+
+    def source_path(self, source):
+        root, extension = os.path.splitext(self.path)
+        digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+        return f"{root}-{digest}{extension}"
+
+    def connect(self, source):
+        # One connection per call so worker threads never share one
+        path = self.source_path(source)
+        connection = sqlite3.connect(path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with self.lock:
+            if path not in self.ready:
+                self.create_tables(connection)
+                connection.commit()
+                self.ready.add(path)
+        return connection
+
+    def create_tables(self, connection):
+        connection.execute("""
+        CREATE TABLE IF NOT EXISTS bucket (
+            stream TEXT NOT NULL,
+            parameter TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            times BLOB NOT NULL,
+            vals BLOB NOT NULL,
+            PRIMARY KEY (stream, parameter, day)
+        ) WITHOUT ROWID
+        """)
+        connection.execute("""
+        CREATE TABLE IF NOT EXISTS coverage (
+            pattern TEXT NOT NULL,
+            parameter TEXT NOT NULL,
+            start_ns INTEGER NOT NULL,
+            end_ns INTEGER NOT NULL
+        )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS coverage_key ON coverage (pattern, parameter)")
+
+        has_rollups = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollup'"
+        ).fetchone()
+        create_rollup_table(connection)
+        if not has_rollups:
+            self.rebuild_rollups(connection)
+
+    def rebuild_rollups(self, connection):
+        # Caches written before rollups existed get them filled in once
+        for stream, parameter, times_blob, values_blob in connection.execute(
+                "SELECT stream, parameter, times, vals FROM bucket").fetchall():
+            write_rollups(connection, stream, parameter,
+                          np.frombuffer(times_blob, dtype=np.int64),
+                          np.frombuffer(values_blob, dtype=np.float64))
+
+    def covered_intervals(self, connection, pattern, parameter):
+        rows = connection.execute(
+            "SELECT start_ns, end_ns FROM coverage WHERE pattern = ? AND parameter = ?",
+            (pattern, parameter)
+        ).fetchall()
+        return merge_intervals(rows)
+
+    def missing_ranges(self, connection, stream_patterns, parameters, start_ns, end_ns):
+        # Group the gaps so streams that miss the same interval share one fetch
+        groups = {}
+        for pattern in stream_patterns:
+            for parameter in parameters:
+                covered = self.covered_intervals(connection, pattern, parameter)
+                for gap in subtract_intervals(start_ns, end_ns, covered):
+                    streams, params = groups.setdefault(gap, (set(), set()))
+                    streams.add(pattern)
+                    params.add(parameter)
+        return [(sorted(streams), sorted(params), gap_start, gap_end)
+                for (gap_start, gap_end), (streams, params) in sorted(groups.items())]
+
+    def mark_covered(self, connection, stream_patterns, parameters, start_ns, end_ns, fetched_ns):
+        end_ns = min(end_ns, (fetched_ns // SECOND_NS - self.settle_time) * SECOND_NS)
+        if end_ns <= start_ns:
+            return
+        for pattern in stream_patterns:
+            for parameter in parameters:
+                intervals = self.covered_intervals(connection, pattern, parameter)
+                intervals = merge_intervals(intervals + [(start_ns, end_ns)])
+                connection.execute(
+                    "DELETE FROM coverage WHERE pattern = ? AND parameter = ?", (pattern, parameter)
+                )
+                connection.executemany(
+                    "INSERT INTO coverage (pattern, parameter, start_ns, end_ns) VALUES (?, ?, ?, ?)",
+                    [(pattern, parameter, start, end) for start, end in intervals]
+                )
+
+    def write_store(self, connection, store):
+        # Merge freshly fetched series into the day buckets; new samples win
+        for stream, parameter, times, values in store.items():
+            days = times // DAY_NS
+            splits = np.flatnonzero(np.diff(days)) + 1
+            for day_times, day_values in zip(np.split(times, splits), np.split(values, splits)):
+                day = int(day_times[0] // DAY_NS)
+                row = connection.execute(
+                    "SELECT times, vals FROM bucket WHERE stream = ? AND parameter = ? AND day = ?",
+                    (stream, parameter, day)
+                ).fetchone()
+                if row is not None:
+                    all_times = np.concatenate([day_times, np.frombuffer(row[0], dtype=np.int64)])
+                    all_values = np.concatenate([day_values, np.frombuffer(row[1], dtype=np.float64)])
+                    day_times, first = np.unique(all_times, return_index=True)
+                    day_values = all_values[first]
+                connection.execute(
+                    "INSERT OR REPLACE INTO bucket (stream, parameter, day, times, vals) VALUES (?, ?, ?, ?, ?)",
+                    (stream, parameter, day,
+                     np.ascontiguousarray(day_times, dtype=np.int64).tobytes(),
+                     np.ascontiguousarray(day_values, dtype=np.float64).tobytes())
+                )
+                write_rollups(connection, stream, parameter, day_times, day_values)
+
+    def load_into(self, connection, store, stream_patterns, parameters, start_ns, end_ns):
+        placeholders = ', '.join(['?'] * len(parameters))
+        day_range = [start_ns // DAY_NS, end_ns // DAY_NS]
+        loaded = set()  # Overlapping patterns must not load a bucket twice
+        for pattern in sorted(stream_patterns):
+            condition = "stream GLOB ?" if is_wildcard(pattern) else "stream = ?"
+            rows = connection.execute(
+                f"""
+                SELECT stream, parameter, day, times, vals FROM bucket
+                WHERE {condition} AND parameter IN ({placeholders}) AND day BETWEEN ? AND ?
+                ORDER BY stream, parameter, day
+                """,
+                [pattern] + list(parameters) + day_range
+            ).fetchall()
+            for stream, parameter, day, times_blob, values_blob in rows:
+                if (stream, parameter, day) in loaded:
+                    continue
+                loaded.add((stream, parameter, day))
+                times = np.frombuffer(times_blob, dtype=np.int64)
+                values = np.frombuffer(values_blob, dtype=np.float64)
+                begin = np.searchsorted(times, start_ns, side='left')
+                end = np.searchsorted(times, end_ns, side='right')
+                store.append(stream, parameter, times[begin:end], values[begin:end])
+
+    def update(self, connection, backend, stream_patterns, parameters, start_ns, end_ns, on_batch=None):
+        # Fetch only what the cache is missing
+        missing = self.missing_ranges(connection, stream_patterns, parameters, start_ns, end_ns)
+        for streams, params, gap_start, gap_end in missing:
+            fetched_ns = time.time_ns()
+            fetched = QCSeriesStore()
+            try:
+                for batch in backend.fetch_batches(streams, params, ns_to_query_time(gap_start),
+                                                   ns_to_query_time(gap_end)):
+                    fetched.append_batch(batch)
+                    if on_batch is not None:
+                        on_batch(batch)
+            except FetchCancelled:
+                # Keep the samples but leave the gap uncovered, so it is
+                # fetched in full next time
+                with connection:
+                    self.write_store(connection, fetched)
+                raise
+            with connection:
+                self.write_store(connection, fetched)
+                self.mark_covered(connection, streams, params, gap_start, gap_end, fetched_ns)
+        return missing
+
+    def count_missing(self, backend, stream_patterns, parameters, start_time, end_time, counter=None):
+        # Records update() will fetch from backend: counter (default backend)
+        # counts over the cache gaps only
+        counter = counter or backend
+        connection = self.connect(backend.source_id())
+        try:
+            missing = self.missing_ranges(connection, stream_patterns, parameters,
+                                          query_time_to_ns(start_time), query_time_to_ns(end_time))
+        finally:
+            connection.close()
+        return sum(counter.count_records(streams, params, ns_to_query_time(gap_start), ns_to_query_time(gap_end))
+                   for streams, params, gap_start, gap_end in missing)
+
+    def fetch_into(self, store, backend, stream_patterns, parameters, start_time, end_time, on_batch=None):
+        # Bring the cache up to date, then fill store from it
+        start_ns = query_time_to_ns(start_time)
+        end_ns = query_time_to_ns(end_time)
+        connection = self.connect(backend.source_id())
+        try:
+            try:
+                missing = self.update(connection, backend, stream_patterns, parameters, start_ns, end_ns, on_batch)
+            except FetchCancelled:
+                # Deliver whatever the cache holds for the range by now
+                self.load_into(connection, store, stream_patterns, parameters, start_ns, end_ns)
+                raise
+            self.load_into(connection, store, stream_patterns, parameters, start_ns, end_ns)
+        finally:
+            connection.close()
+        return missing
+
+    def fetch_rollups(self, backend, stream_patterns, parameters, start_time, end_time, pixels, on_batch=None):
+        # RollupStore at the coarsest level with ~one bucket per pixel, or
+        # None if the range is short enough that raw data should be drawn
+        start_ns = query_time_to_ns(start_time)
+        end_ns = query_time_to_ns(end_time)
+        resolution = choose_resolution(start_ns, end_ns, pixels)
+        if resolution is None:
+            return None
+        connection = self.connect(backend.source_id())
+        cancelled = None
+        try:
+            try:
+                self.update(connection, backend, stream_patterns, parameters, start_ns, end_ns, on_batch)
+            except FetchCancelled as e:
+                cancelled = e
+            store = RollupStore(resolution)
+            for pattern in sorted(stream_patterns):
+                condition = "stream GLOB ?" if is_wildcard(pattern) else "stream = ?"
+                load_rollups(connection, condition, [pattern], parameters, start_ns, end_ns, resolution, store)
+        finally:
+            connection.close()
+        if cancelled is not None:
+            cancelled.partial = store
+            raise cancelled
+        return store
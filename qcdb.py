@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+# Pooled access to the SeisComP database.
+#
+# Connections are handed out per call, so the GUI thread and background
+# workers can query at the same time. Idle connections are pinged before
+# reuse and transparently reconnected after a MySQL timeout. Queries run as
+# server-side prepared statements that are cached per connection, and IN
+# lists are bound as parameters in a few fixed sizes so the same prepared
+# statement is reused across selections.
+#
+# With QC_SQLITE_DATABASE set, connections go to that SQLite stand-in
+# (see qcsqlite) instead of MySQL.
+
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# MySQL connector
+import mysql.connector
+from mysql.connector import Error
+
+from qcsqlite import connect_sqlite
+
+DB_CONFIG = {
+    'host': "127.0.0.1",
+    'user': "sysop",
+    'password': "sysop",
+    'database': "seiscomp",
+    'port': 3306,
+}
+if os.environ.get('QC_SQLITE_DATABASE'):
+    DB_CONFIG = {'sqlite': os.environ['QC_SQLITE_DATABASE']}
+
+# IN lists are padded up to one of these sizes and split beyond the last
+IN_LIST_SIZES = [1, 4, 16, 64, 256, 1024]
+
+PLACEHOLDER_PATTERN = re.compile(r'(%s|\{\w+\})')
+
+
+def connect_database(config=DB_CONFIG):
+    if 'sqlite' in config:
+        return connect_sqlite(config['sqlite'])
+    return mysql.connector.connect(**config)
+
+
+def kill_query(connection, connect=connect_database):
+    # Abort the statement running on connection from another thread. MySQL
+    # needs a second connection for KILL QUERY; SQLite can interrupt directly.
+    if hasattr(connection, 'interrupt'):
+        connection.interrupt()
+        return
+    killer = connect()
+    try:
+        cursor = killer.cursor()
+        cursor.execute(f"KILL QUERY {int(connection.connection_id)}")
+        cursor.close()
+    finally:
+        killer.close()
+
+
+def padded_in_list(values):
+    # Repeat the last value so the list has a standard length; duplicates
+    # do not change the result of an IN condition
+    size = next(size for size in IN_LIST_SIZES if size >= len(values))
+    return list(values) + [values[-1]] * (size - len(values))
+
+
+def bind_query(query, params=(), in_lists=None):
+    # Expand {name} fields into bound IN lists and order the arguments to
+    # match the placeholders as they appear in the query text
+    in_lists = in_lists or {}
+    params = list(params)
+    sql_parts = []
+    args = []
+    for part in PLACEHOLDER_PATTERN.split(query):
+        if part == '%s':
+            sql_parts.append(part)
+            args.append(params.pop(0))
+        elif part.startswith('{') and part.endswith('}') and part[1:-1] in in_lists:
+            values = in_lists[part[1:-1]]
+            if not values:
+                # An empty IN list matches nothing
+                sql_parts.append('NULL')
+                continue
+            values = padded_in_list(values)
+            sql_parts.append(', '.join(['%s'] * len(values)))
+            args.extend(values)
+        else:
+            sql_parts.append(part)
+    return ''.join(sql_parts), args
+
+
+def split_in_lists(in_lists):
+    # Yield combinations of IN list chunks no longer than the largest size
+    limit = IN_LIST_SIZES[-1]
+    names = list(in_lists)
+    if not names:
+        yield {}
+        return
+    first, rest = names[0], {name: in_lists[name] for name in names[1:]}
+    values = list(in_lists[first])
+    for i in range(0, len(values), limit):
+        for combination in split_in_lists(rest):
+            combination[first] = values[i:i + limit]
+            yield combination
+
+
+class PooledConnection:
+    def __init__(self, config):
+        self.config = config
+        self.connection = connect_database(config)
+        self.statements = {}
+        self.last_used = time.monotonic()
+
+    def check(self, ping_interval):
+        # Health check before reuse; reconnects after server-side timeouts
+        if time.monotonic() - self.last_used < ping_interval and self.connection.is_connected():
+            return
+        connection_id = self.connection.connection_id
+        try:
+            self.connection.ping(reconnect=True, attempts=3, delay=1)
+        except Error:
+            self.close()
+            self.connection = connect_database(self.config)
+        if self.connection.connection_id != connection_id:
+            # Prepared statements do not survive a reconnect
+            self.statements = {}
+
+    def prepared_cursor(self, query):
+        cursor = self.statements.get(query)
+        if cursor is None:
+            cursor = self.connection.cursor(prepared=True)
+            self.statements[query] = cursor
+        return cursor
+
+    def close(self):
+        for cursor in self.statements.values():
+            try:
+                cursor.close()
+            except Error:
+                pass
+        self.statements = {}
+        try:
+            self.connection.close()
+        except Error:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, size=10, config=DB_CONFIG, ping_interval=60, timeout=30):
+        self.size = size
+        self.config = config
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            pooled = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.created < self.size
+                if create:
+                    self.created += 1
+            if create:
+                try:
+                    return PooledConnection(self.config)
+                except Error:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+            pooled = self.idle.get(timeout=self.timeout)
+        pooled.check(self.ping_interval)
+        return pooled
+
+    def release(self, pooled):
+        pooled.last_used = time.monotonic()
+        self.idle.put(pooled)
+
+    def discard(self, pooled):
+        pooled.close()
+        with self.lock:
+            self.created -= 1
+
+    @contextmanager
+    def connection(self):
+        pooled = self.acquire()
+        try:
+            yield pooled
+        except BaseException:
+            # The connection may be broken or hold unread results
+            self.discard(pooled)
+            raise
+        else:
+            self.release(pooled)
+
+    def execute(self, query, params=(), in_lists=None):
+        # Run a SELECT as a cached prepared statement and return all rows;
+        # {name} fields in the query are filled from in_lists. Lists longer
+        # than the largest IN size run as several statements, so ORDER BY
+        # then only holds within each part.
+        rows = []
+        with self.connection() as pooled:
+            for chunk in split_in_lists(in_lists or {}):
+                sql, args = bind_query(query, params, chunk)
+                cursor = pooled.prepared_cursor(sql)
+                cursor.execute(sql, args)
+                rows.extend(cursor.fetchall())
+        return rows
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self.lock:
+            self.created = 0
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# Chunked export of QC results to CSV, gzip-compressed CSV, Parquet and
+# Arrow IPC.
+#
+# Data is taken straight from the column arrays of a QCSeriesStore (or a
+# report frame) and written a chunk at a time, so exports of any size run
+# in bounded memory and can report progress. Parquet and Arrow need
+# pyarrow; CSV export works with pandas alone.
+
+import gzip
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+from qcstore import ns_to_datetime64
+
+CHUNK_ROWS = 1000000
+
+# Format name, file suffix, file dialog filter
+EXPORT_FORMATS = [
+    ('csv', '.csv', "CSV (*.csv)"),
+    ('csv.gz', '.csv.gz', "Compressed CSV (*.csv.gz)"),
+    ('parquet', '.parquet', "Parquet (*.parquet)"),
+    ('arrow', '.arrow', "Arrow IPC (*.arrow)"),
+]
+
+
+class ExportError(Exception):
+    pass
+
+
+def format_for_path(path, default='csv'):
+    for name, suffix, _ in sorted(EXPORT_FORMATS, key=lambda entry: -len(entry[1])):
+        if path.endswith(suffix):
+            return name
+    if path.endswith('.feather'):
+        return 'arrow'
+    return default
+
+
+def format_for_filter(name_filter):
+    for name, _, dialog_filter in EXPORT_FORMATS:
+        if dialog_filter == name_filter:
+            return name
+    return None
+
+
+def dialog_filters():
+    return ';;'.join(dialog_filter for _, _, dialog_filter in EXPORT_FORMATS)
+
+
+def series_row_count(store):
+    if hasattr(store, 'columns'):
+        return len(store)
+    return sum(len(times) for _, _, times, _ in store.items())
+
+
+def series_chunks(store, chunk_rows=CHUNK_ROWS):
+    # One frame per chunk with stream, parameter, time and value columns
+    if hasattr(store, 'columns'):
+        stream_ids, parameter_ids, times_ns, values = store.columns()
+        stream_keys = list(store.stream_keys)
+        parameter_names = list(store.parameter_names)
+        for begin in range(0, len(times_ns), chunk_rows):
+            end = begin + chunk_rows
+            yield pd.DataFrame({
+                'stream': pd.Categorical.from_codes(stream_ids[begin:end], stream_keys),
+                'parameter': pd.Categorical.from_codes(parameter_ids[begin:end], parameter_names),
+                'time': ns_to_datetime64(times_ns[begin:end]),
+                'value': values[begin:end]
+            })
+        return
+
+    # Rollups: a few points per series, so one chunk per series is fine
+    for stream_key, parameter, times_ns, values in store.items():
+        yield pd.DataFrame({
+            'stream': np.full(len(times_ns), stream_key, dtype=object),
+            'parameter': np.full(len(times_ns), parameter, dtype=object),
+            'time': ns_to_datetime64(times_ns),
+            'value': values
+        })
+
+
+def frame_chunks(frame, chunk_rows=CHUNK_ROWS):
+    for begin in range(0, len(frame), chunk_rows):
+        yield frame.iloc[begin:begin + chunk_rows]
+
+
+class CSVWriter:
+    def __init__(self, path, compress=False):
+        self.file = gzip.open(path, 'wt', newline='') if compress else open(path, 'w', newline='')
+        self.header = True
+
+    def write(self, chunk):
+        chunk.to_csv(self.file, header=self.header, index=False, na_rep='N/A')
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class ArrowWriter:
+    def __init__(self, path, parquet=False):
+        if pa is None:
+            raise ExportError("Parquet and Arrow export need the pyarrow package")
+        self.path = path
+        self.parquet = parquet
+        self.writer = None
+        self.schema = None
+
+    def write(self, chunk):
+        # Conversion and writer failures (ArrowInvalid, ArrowTypeError, ...)
+        # are reported as ExportError like every other export problem
+        try:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self.writer is None:
+                self.schema = table.schema
+                if self.parquet:
+                    self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema, compression='zstd')
+                else:
+                    options = pyarrow.ipc.IpcWriteOptions(compression='zstd')
+                    self.writer = pyarrow.ipc.new_file(self.path, self.schema, options=options)
+            else:
+                table = table.cast(self.schema)
+            self.writer.write_table(table)
+        except pa.ArrowException as e:
+            raise ExportError(str(e)) from e
+
+    def close(self):
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except pa.ArrowException as e:
+                raise ExportError(str(e)) from e
+
+
+def open_writer(path, file_format):
+    if file_format == 'csv':
+        return CSVWriter(path)
+    if file_format == 'csv.gz':
+        return CSVWriter(path, compress=True)
+    if file_format == 'parquet':
+        return ArrowWriter(path, parquet=True)
+    if file_format == 'arrow':
+        return ArrowWriter(path)
+    raise ExportError(f"Unknown export format: {file_format}")
+
+
+def export_chunks(chunks, path, file_format=None, total_rows=None, on_progress=None):
+    # Write frames from chunks to one file; on_progress gets the percentage
+    # written when total_rows is known. Returns the number of rows written.
+    writer = open_writer(path, file_format or format_for_path(path))
+    written = 0
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            written += len(chunk)
+            if on_progress is not None and total_rows:
+                on_progress(int(written * 100 / total_rows))
+    finally:
+        writer.close()
+    return written
+
+
+def export_series(store, path, file_format=None, on_progress=None):
+    return export_chunks(series_chunks(store), path, file_format, series_row_count(store), on_progress)
+
+
+def export_frame(frame, path, file_format=None, on_progress=None):
+    return export_chunks(frame_chunks(frame), path, file_format, len(frame), on_progress)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+# Cached client for the FDSNWS station service.
+#
+# The channel-level inventory is fetched once in text format and kept as a
+# Network -> Station -> Location -> [Channel] tree that answers all code
+# lookups locally. Later refreshes are conditional requests (ETag /
+# Last-Modified), so an unchanged inventory costs one 304 round-trip on a
+# kept-alive connection.
+
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+FDSNWS_STATION_URL = os.environ.get('FDSNWS_STATION_URL', 'http://localhost:8081/fdsnws/station/1')
+
+
+class FDSNError(Exception):
+    pass
+
+
+def parse_channel_text(text):
+    # Network|Station|Location|Channel|... rows; header lines start with '#'
+    tree = {}
+    for line in text.splitlines():
+        if not line.strip() or line.startswith('#'):
+            continue
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) < 4:
+            continue
+        network, station, location, channel = fields[:4]
+        channels = tree.setdefault(network, {}).setdefault(station, {}).setdefault(location, [])
+        if channel not in channels:
+            channels.append(channel)
+    for stations in tree.values():
+        for locations in stations.values():
+            for channels in locations.values():
+                channels.sort()
+    return tree
+
+
+class FDSNStationClient:
+    def __init__(self, base_url=FDSNWS_STATION_URL, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        # One session so every request reuses the same keep-alive connection
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.tree = {}
+        self.etag = None
+        self.last_modified = None
+
+    def query_url(self):
+        return f"{self.base_url}/query?level=channel&format=text&nodata=404"
+
+    def refresh(self):
+        # Returns True if the tree changed, False if the server reported
+        # that the cached inventory is still current
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        try:
+            response = self.session.get(self.query_url(), headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise FDSNError(f"FDSNWS request failed: {e}")
+
+        if response.status_code == 304:
+            return False
+        if response.status_code in (204, 404):
+            # nodata: the service has no matching inventory
+            tree = {}
+        elif response.status_code != 200:
+            raise FDSNError(f"FDSNWS returned HTTP {response.status_code}: {response.text[:200]}")
+        else:
+            tree = parse_channel_text(response.text)
+
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        changed = tree != self.tree
+        self.tree = tree
+        return changed
+
+    def networks(self):
+        return sorted(self.tree)
+
+    def stations(self, network):
+        return sorted(self.tree.get(network, {}))
+
+    def locations(self, network, station):
+        return sorted(self.tree.get(network, {}).get(station, {}))
+
+    def channels(self, network, station, location):
+        return list(self.tree.get(network, {}).get(station, {}).get(location, []))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,619 @@
+#!/usr/bin/env python3
+
+# Fetch layer for SeisComP WaveformQuality (QC) records.
+#
+# Nothing in here imports PyQt5 or matplotlib, so the same code can be used
+# from the GUI worker threads and from headless scripts.
+
+import copy
+import datetime
+import math
+import os
+import signal
+import subprocess
+import threading
+import time
+import urllib.parse
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+# XML parsing
+from lxml import etree as ET
+
+from qcdb import DB_CONFIG, Error, connect_database, kill_query
+from qcstore import QCSeriesStore, ns_to_query_time, query_time_to_ns
+
+# One QC measurement, already converted to Python types
+QCRecord = namedtuple('QCRecord', [
+    'network', 'station', 'location', 'channel', 'parameter', 'time', 'value'
+])
+
+# Parameters written by scqc
+QC_PARAMETERS = [
+    'latency', 'delay', 'timing', 'offset', 'rms', 'availability',
+    'gaps count', 'gaps interval', 'gaps length', 'overlaps count',
+    'overlaps interval', 'overlaps length', 'spikes count',
+    'spikes interval', 'spikes amplitude'
+]
+
+
+class FetchError(Exception):
+    pass
+
+
+class FetchCancelled(FetchError):
+    # partial holds the data fetched before the cancel, where it is known
+    def __init__(self, message="Fetch cancelled", partial=None):
+        super().__init__(message)
+        self.partial = partial
+
+
+class Cancellation:
+    """Cancel flag shared by a backend, its shards and the caller.
+
+    Running queries and processes register a callback that aborts them, so
+    cancel() stops them at once instead of at the next batch boundary. In a
+    worker process a backend gets a fresh, unset flag.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.aborts = {}
+
+    def is_set(self):
+        return self.event.is_set()
+
+    def check(self):
+        if self.event.is_set():
+            raise FetchCancelled()
+
+    def cancel(self):
+        self.event.set()
+        with self.lock:
+            aborts = list(self.aborts.values())
+        for abort in aborts:
+            try:
+                abort()
+            except (Error, OSError) as e:
+                print(f"Error aborting fetch: {e}")
+
+    @contextmanager
+    def running(self, abort):
+        key = object()
+        with self.lock:
+            self.aborts[key] = abort
+        try:
+            # A cancel that came in before registration still applies
+            self.check()
+            yield
+        finally:
+            with self.lock:
+                del self.aborts[key]
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+
+def scqueryqc_database_url(config=DB_CONFIG):
+    if 'sqlite' in config:
+        return f"sqlite3://{os.path.abspath(config['sqlite'])}"
+    return f"mysql://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{config['database']}"
+
+
+def database_identity(config=DB_CONFIG):
+    # The database a config points at, without credentials
+    if 'sqlite' in config:
+        return f"sqlite3://{os.path.abspath(config['sqlite'])}"
+    return f"mysql://{config['user']}@{config['host']}:{config['port']}/{config['database']}"
+
+
+def split_stream_id(stream_id):
+    network, station, location, channel = stream_id.split('.')
+    return network, station, location, channel
+
+
+def decode_text(value):
+    # The connector returns bytearrays for some text columns
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    return value
+
+
+def parse_qc_time(text):
+    # scqueryqc writes e.g. 2024-05-01T10:00:00.000000Z
+    try:
+        return datetime.datetime.fromisoformat(text.rstrip('Z'))
+    except ValueError:
+        return datetime.datetime.strptime(text, "%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def is_wildcard(code):
+    return '*' in code or '?' in code
+
+
+def wildcard_to_like(code):
+    escaped = code.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped.replace('*', '%').replace('?', '_')
+
+
+class WaveformQualityBackend:
+    """Reads QC records straight from the WaveformQuality table."""
+
+    STREAM_COLUMNS = (
+        'waveformID_networkCode', 'waveformID_stationCode',
+        'waveformID_locationCode', 'waveformID_channelCode'
+    )
+
+    def __init__(self, connect=None, qc_type='report', chunk_size=500, fetch_size=5000, pool=None):
+        # Module-level default so the backend can be sent to worker processes
+        self.connect = connect or connect_database
+        self.pool = pool
+        self.qc_type = qc_type
+        self.chunk_size = chunk_size  # Streams per query
+        self.fetch_size = fetch_size  # Rows per round-trip
+        # Live tailing: only rows inserted after this _oid; last_oid is the
+        # highest _oid seen by the last fetch
+        self.after_oid = None
+        self.last_oid = None
+        # Optional qctiming.StageTimer for the query and conversion stages
+        self.timer = None
+        self.cancellation = Cancellation()
+
+    def source_id(self):
+        # Identifies the rows this backend reads, e.g. to keep cached data
+        # of different databases apart
+        if self.pool is not None:
+            database = database_identity(self.pool.config)
+        elif self.connect is connect_database:
+            database = database_identity()
+        else:
+            database = f"{self.connect.__module__}.{self.connect.__qualname__}"
+        return f"database {database} type={self.qc_type or '*'}"
+
+    def build_queries(self, stream_patterns, parameters, start_time, end_time, count=False):
+        # With count=True the queries return COUNT(*) of the same rows
+        exact = []
+        wildcard = []
+        for stream_id in stream_patterns:
+            codes = split_stream_id(stream_id)
+            if any(is_wildcard(code) for code in codes):
+                wildcard.append(codes)
+            else:
+                exact.append(codes)
+
+        if count:
+            select_columns = "COUNT(*)"
+        else:
+            select_columns = """
+            waveformID_networkCode, waveformID_stationCode,
+            waveformID_locationCode, waveformID_channelCode,
+            parameter, start, start_ms, value"""
+            if self.after_oid is not None:
+                select_columns += ", _oid"
+        base_query = f"""
+        SELECT {select_columns}
+        FROM WaveformQuality
+        WHERE start >= %s AND start <= %s
+        """
+        base_args = [start_time, end_time]
+        if self.after_oid is not None:
+            base_query += " AND _oid > %s"
+            base_args.append(self.after_oid)
+        if self.qc_type:
+            base_query += " AND type = %s"
+            base_args.append(self.qc_type)
+        if parameters:
+            base_query += f" AND parameter IN ({', '.join(['%s'] * len(parameters))})"
+            base_args.extend(parameters)
+
+        order = "" if count else " ORDER BY start, start_ms"
+        columns = ', '.join(self.STREAM_COLUMNS)
+        for i in range(0, len(exact), self.chunk_size):
+            chunk = exact[i:i + self.chunk_size]
+            placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(chunk))
+            query = base_query + f" AND ({columns}) IN ({placeholders})"
+            args = list(base_args)
+            for codes in chunk:
+                args.extend(codes)
+            yield query + order, args
+
+        for i in range(0, len(wildcard), self.chunk_size):
+            chunk = wildcard[i:i + self.chunk_size]
+            conditions = []
+            args = list(base_args)
+            for codes in chunk:
+                parts = []
+                for column, code in zip(self.STREAM_COLUMNS, codes):
+                    if is_wildcard(code):
+                        parts.append(f"{column} LIKE %s")
+                        args.append(wildcard_to_like(code))
+                    else:
+                        parts.append(f"{column} = %s")
+                        args.append(code)
+                conditions.append(f"({' AND '.join(parts)})")
+            query = base_query + f" AND ({' OR '.join(conditions)})"
+            yield query + order, args
+
+    def row_to_record(self, row):
+        network, station, location, channel, parameter, start, start_ms, value = row[:8]
+        if start_ms:
+            start = start.replace(microsecond=int(start_ms))
+        return QCRecord(
+            decode_text(network),
+            decode_text(station),
+            decode_text(location) or '',
+            decode_text(channel),
+            decode_text(parameter),
+            start,
+            float(value)
+        )
+
+    def fetch(self, stream_patterns, parameters, start_time, end_time):
+        for batch in self.fetch_batches(stream_patterns, parameters, start_time, end_time):
+            yield from batch
+
+    def cancel(self):
+        # Callable from any thread: aborts running queries, fetches then
+        # raise FetchCancelled
+        self.cancellation.cancel()
+
+    def abort_query(self, connection):
+        if self.pool is not None:
+            kill_query(connection, lambda: connect_database(self.pool.config))
+        else:
+            kill_query(connection, self.connect)
+
+    def count_records(self, stream_patterns, parameters, start_time, end_time):
+        # Exact number of records fetch_batches will return, from COUNT(*)
+        # over the same conditions (served from the start index)
+        self.cancellation.check()
+        if self.pool is not None:
+            with self.pool.connection() as pooled:
+                return self.count_from(pooled.connection, stream_patterns, parameters, start_time, end_time)
+        connection = self.connect()
+        try:
+            return self.count_from(connection, stream_patterns, parameters, start_time, end_time)
+        finally:
+            connection.close()
+
+    def count_from(self, connection, stream_patterns, parameters, start_time, end_time):
+        total = 0
+        cursor = connection.cursor()
+        try:
+            with self.cancellation.running(lambda: self.abort_query(connection)):
+                for query, args in self.build_queries(stream_patterns, parameters, start_time, end_time, count=True):
+                    cursor.execute(query, args)
+                    total += cursor.fetchall()[0][0]
+        except Error:
+            if self.cancellation.is_set():
+                raise FetchCancelled()
+            raise
+        finally:
+            cursor.close()
+        return total
+
+    def fetch_batches(self, stream_patterns, parameters, start_time, end_time):
+        self.cancellation.check()
+        if self.pool is not None:
+            with self.pool.connection() as pooled:
+                yield from self.fetch_from(pooled.connection, stream_patterns, parameters, start_time, end_time)
+            return
+        connection = self.connect()
+        try:
+            yield from self.fetch_from(connection, stream_patterns, parameters, start_time, end_time)
+        finally:
+            connection.close()
+
+    def fetch_from(self, connection, stream_patterns, parameters, start_time, end_time):
+        # Generator: rows are pulled from the server in fetch_size batches
+        # through an unbuffered cursor, so the result set is never held twice.
+        # A cancel kills the running query, so the server stops sending rows
+        # and the cursor fails instead of draining the rest of the result.
+        cursor = connection.cursor(buffered=False)
+        try:
+            with self.cancellation.running(lambda: self.abort_query(connection)):
+                for query, args in self.build_queries(stream_patterns, parameters, start_time, end_time):
+                    started = time.perf_counter()
+                    cursor.execute(query, args)
+                    while True:
+                        rows = cursor.fetchmany(self.fetch_size)
+                        if not rows:
+                            break
+                        if self.after_oid is not None:
+                            self.last_oid = max([self.last_oid or 0] + [row[8] for row in rows])
+                        fetched = time.perf_counter()
+                        records = [self.row_to_record(row) for row in rows]
+                        if self.timer is not None:
+                            self.timer.add('database query', fetched - started, len(rows))
+                            self.timer.add('convert rows', time.perf_counter() - fetched, len(records))
+                        yield records
+                        self.cancellation.check()
+                        started = time.perf_counter()
+                    if self.timer is not None:
+                        # The final empty fetch
+                        self.timer.add('database query', time.perf_counter() - started)
+        except Error:
+            if self.cancellation.is_set():
+                raise FetchCancelled()
+            raise
+        finally:
+            try:
+                cursor.close()
+            except Error:
+                # Unread rows of a killed query
+                if not self.cancellation.is_set():
+                    raise
+
+
+class ScQueryQCParser:
+    """Incremental parser for scqueryqc XML output.
+
+    Bytes are fed in as they come out of the process and finished
+    waveformQuality elements are turned into QCRecords and dropped from the
+    tree straight away, so memory does not grow with the size of the output.
+    Works for any seiscomp3-schema namespace version.
+    """
+
+    def __init__(self, parameters=None):
+        self.parameters = set(parameters) if parameters else None
+        self.parser = ET.XMLPullParser(events=('end',), tag='{*}waveformQuality', huge_tree=True)
+        self.bytes_fed = 0
+
+    def feed(self, data):
+        self.bytes_fed += len(data)
+        self.parser.feed(data)
+        return self.read_records()
+
+    def close(self):
+        self.parser.close()
+        return self.read_records()
+
+    def read_records(self):
+        records = []
+        for _, element in self.parser.read_events():
+            record = self.element_to_record(element)
+            if record is not None:
+                records.append(record)
+
+            # Free the element and everything parsed before it
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+        return records
+
+    def element_to_record(self, element):
+        start = value = parameter = waveform_id = None
+        for child in element:
+            name = local_name(child.tag)
+            if name == 'start':
+                start = child.text
+            elif name == 'value':
+                value = child.text
+            elif name == 'parameter':
+                parameter = child.text
+            elif name == 'waveformID':
+                waveform_id = child
+
+        if start is None or value is None or parameter is None or waveform_id is None:
+            return None
+        if self.parameters is not None and parameter not in self.parameters:
+            return None
+
+        return QCRecord(
+            waveform_id.get('networkCode'),
+            waveform_id.get('stationCode'),
+            waveform_id.get('locationCode') or '',
+            waveform_id.get('channelCode'),
+            parameter,
+            parse_qc_time(start),
+            float(value)
+        )
+
+
+class ScQueryQCBackend:
+    """Runs scqueryqc and streams its XML output through ScQueryQCParser."""
+
+    def __init__(self, database_url=None, read_size=65536):
+        self.database_url = database_url or scqueryqc_database_url()
+        self.read_size = read_size
+        self.bytes_read = 0
+        # Optional qctiming.StageTimer for the process output and parse stages
+        self.timer = None
+        self.cancellation = Cancellation()
+
+    def build_command(self, stream_patterns, parameters, start_time, end_time):
+        p_parameter = ','.join(f'"{param}"' if ' ' in param else param for param in parameters)
+        i_parameter = ','.join(stream_patterns)
+        return f"scqueryqc -d {self.database_url} -f -b '{start_time}' -e '{end_time}' -p {p_parameter} -i {i_parameter}"
+
+    def source_id(self):
+        # scqueryqc returns QC records of every type
+        url = self.database_url
+        password = urllib.parse.urlsplit(url).password
+        if password is not None:
+            url = url.replace(f":{password}@", "@", 1)
+        return f"scqueryqc {url} type=*"
+
+    def cancel(self):
+        # Callable from any thread: kills running scqueryqc processes
+        self.cancellation.cancel()
+
+    def kill_process(self, process):
+        # The shell and scqueryqc share the session started for them
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def fetch_batches(self, stream_patterns, parameters, start_time, end_time):
+        self.cancellation.check()
+        command = self.build_command(stream_patterns, parameters, start_time, end_time)
+        process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   start_new_session=True)
+        # stderr is drained while stdout is read, so a chatty scqueryqc never
+        # blocks on a full pipe; the end of it is kept for the error message
+        stderr_chunks = deque(maxlen=16)
+        stderr_reader = threading.Thread(target=self.read_stderr, args=(process.stderr, stderr_chunks), daemon=True)
+        stderr_reader.start()
+        parser = ScQueryQCParser(parameters)
+        try:
+            with self.cancellation.running(lambda: self.kill_process(process)):
+                yield from self.read_output(process, parser)
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+            stderr_reader.join()
+            process.stderr.close()
+
+        if self.cancellation.is_set():
+            raise FetchCancelled()
+        if returncode != 0:
+            error = b''.join(stderr_chunks).decode('utf-8', errors='replace')
+            raise FetchError(f"Command failed with error:\n{error}")
+        if parser.bytes_fed:
+            batch = parser.close()
+            if batch:
+                yield batch
+
+    def read_stderr(self, stream, chunks):
+        while True:
+            chunk = stream.read1(self.read_size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+    def read_output(self, process, parser):
+        while True:
+            started = time.perf_counter()
+            chunk = process.stdout.read1(self.read_size)
+            read = time.perf_counter()
+            if self.timer is not None:
+                self.timer.add('scqueryqc output', read - started, nbytes=len(chunk))
+            if not chunk:
+                break
+            self.bytes_read += len(chunk)
+            batch = parser.feed(chunk)
+            if self.timer is not None:
+                self.timer.add('parse XML', time.perf_counter() - read, len(batch), len(chunk))
+            if batch:
+                yield batch
+
+
+def fetch_shard(backend, stream_patterns, parameters, start_time, end_time):
+    # Runs in a pool worker: fetch and parse one shard into a compact store
+    store = QCSeriesStore()
+    try:
+        for batch in backend.fetch_batches(stream_patterns, parameters, start_time, end_time):
+            store.append_records(batch)
+    except FetchCancelled as e:
+        store.compact()
+        e.partial = store
+        raise
+    store.compact()
+    store.shrink()
+    return store
+
+
+class ShardedBackend:
+    """Splits a fetch into stream and time shards and runs them concurrently.
+
+    Each shard is a separate backend call (one scqueryqc process or one SQL
+    query stream). With use_processes=False the shards run in threads, which
+    overlaps the scqueryqc processes and database round-trips; with
+    use_processes=True parsing is spread over CPU cores as well, at the cost
+    of starting worker interpreters. Thread shards share the backend's
+    cancel flag and stop at once; process shards cannot be reached and are
+    left to finish in the background.
+    """
+
+    def __init__(self, backend, max_workers=None, use_processes=False, shards_per_worker=2):
+        self.backend = backend
+        self.max_workers = max_workers or min(os.cpu_count() or 1, 8)
+        self.use_processes = use_processes
+        self.shards_per_worker = shards_per_worker
+        self.shards_total = 0
+        self.shards_done = 0
+
+    def build_command(self, stream_patterns, parameters, start_time, end_time):
+        return self.backend.build_command(stream_patterns, parameters, start_time, end_time)
+
+    @property
+    def cancellation(self):
+        return self.backend.cancellation
+
+    def cancel(self):
+        self.backend.cancel()
+
+    def source_id(self):
+        return self.backend.source_id()
+
+    def shards(self, stream_patterns, parameters, start_time, end_time):
+        # Prefer splitting by stream; fall back to time slices for few streams
+        streams = sorted(stream_patterns)
+        if not streams:
+            return []
+        target = self.max_workers * self.shards_per_worker
+        stream_chunks = max(min(len(streams), target), 1)
+        chunk_size = math.ceil(len(streams) / stream_chunks)
+
+        start_ns = query_time_to_ns(start_time)
+        end_ns = query_time_to_ns(end_time)
+        time_slices = max(math.ceil(target / stream_chunks), 1)
+        # Whole seconds, and each slice ends one second before the next starts
+        slice_ns = max(math.ceil((end_ns - start_ns) / time_slices / 10**9), 1) * 10**9
+        slices = []
+        slice_start = start_ns
+        while slice_start <= end_ns:
+            next_start = slice_start + slice_ns
+            # The last slice also takes the (inclusive) end time
+            slice_end = end_ns if next_start >= end_ns else next_start - 10**9
+            slices.append((ns_to_query_time(slice_start), ns_to_query_time(slice_end)))
+            if slice_end == end_ns:
+                break
+            slice_start = next_start
+
+        return [(streams[i:i + chunk_size], parameters, slice_begin, slice_end)
+                for i in range(0, len(streams), chunk_size)
+                for slice_begin, slice_end in slices]
+
+    def fetch_batches(self, stream_patterns, parameters, start_time, end_time):
+        # Yields one QCSeriesStore per finished shard
+        shards = self.shards(stream_patterns, parameters, start_time, end_time)
+        self.shards_total = len(shards)
+        self.shards_done = 0
+        backend = self.backend
+        if self.use_processes and getattr(backend, 'timer', None) is not None:
+            # A timer cannot be sent to worker processes; their stages go unrecorded
+            backend = copy.copy(backend)
+            backend.timer = None
+        executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        executor = executor_class(max_workers=self.max_workers)
+        pending = {executor.submit(fetch_shard, backend, *shard) for shard in shards}
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        store = future.result()
+                    except FetchCancelled as e:
+                        # Keep what the shard fetched before it was stopped
+                        store = e.partial
+                    except CancelledError:
+                        continue
+                    self.shards_done += 1
+                    if store is not None:
+                        yield store
+                if self.use_processes and self.cancellation.is_set():
+                    break
+        finally:
+            executor.shutdown(wait=not self.cancellation.is_set(), cancel_futures=True)
+        self.cancellation.check()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+# In-memory index of the SeisComP inventory and station bindings.
+#
+# Network -> Station -> (location, channel, epoch) is loaded once with one
+# join, together with the detecStream/detecLocid defaults of the trunk
+# bindings. All lookups the GUI needs while clicking through selections are
+# answered from dictionaries. After the TTL expires a background thread
+# compares a cheap change fingerprint with the database and reloads only if
+# the inventory or the bindings changed.
+
+import datetime
+import threading
+import time
+from collections import namedtuple
+
+from qcdb import Error
+
+StreamEpoch = namedtuple('StreamEpoch', ['location', 'channel', 'start', 'end'])
+
+InventoryState = namedtuple('InventoryState', [
+    'networks', 'stations', 'streams', 'default_channels', 'fingerprint'
+])
+
+INVENTORY_QUERY = """
+SELECT
+    Network.code, Station.code, SensorLocation.code, Stream.code,
+    Network.start, Network.end, Station.start, Station.end,
+    SensorLocation.start, SensorLocation.end, Stream.start, Stream.end
+FROM Network
+JOIN Station ON Network._oid = Station._parent_oid
+JOIN SensorLocation ON Station._oid = SensorLocation._parent_oid
+JOIN Stream ON SensorLocation._oid = Stream._parent_oid
+"""
+
+STATION_QUERY = """
+SELECT Network.code, Station.code
+FROM Station
+JOIN Network ON Station._parent_oid = Network._oid
+"""
+
+DEFAULT_CHANNELS_QUERY = """
+SELECT
+    cs.networkCode AS network,
+    cs.stationCode AS station,
+    pm_stream.value AS detecStream,
+    pm_locid.value AS detecLocid
+FROM
+    ConfigModule cm
+    JOIN ConfigStation cs ON cs._parent_oid=cm._oid AND cm.name='trunk'
+    JOIN Setup su ON su._parent_oid=cs._oid AND su.name='default'
+    JOIN PublicObject po ON po.publicID=su.parameterSetID
+    JOIN Parameter pm_stream ON pm_stream._parent_oid=po._oid AND pm_stream.name='detecStream'
+    LEFT JOIN Parameter pm_locid ON pm_locid._parent_oid=po._oid AND pm_locid.name='detecLocid'
+"""
+
+# Changes to any of these tables invalidate the index
+FINGERPRINT_TABLES = ['Network', 'Station', 'SensorLocation', 'Stream', 'ConfigStation', 'Setup', 'Parameter']
+
+
+def decode_text(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    return value
+
+
+def append_z_if_needed(channel):
+    two_letter_codes = ['BH', 'HH', 'SH', 'EH', 'LH', 'CH']  # Add more if needed
+    if any(channel.startswith(code) for code in two_letter_codes) and len(channel) == 2:
+        return channel + 'Z'
+    return channel
+
+
+def is_qc_channel(channel):
+    # Vertical components plus EDH/BDF channels, as selected by the QC views
+    if channel.endswith('Z'):
+        return True
+    return len(channel) == 3 and channel.startswith(('ED', 'BD'))
+
+
+def to_datetime(value):
+    if isinstance(value, str):
+        return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    return value
+
+
+class InventoryIndex:
+    def __init__(self, pool, ttl=600):
+        self.pool = pool
+        self.ttl = ttl
+        self.state = InventoryState([], {}, {}, {}, None)
+        self.loaded_at = 0
+        self.refreshing = False
+        self.lock = threading.Lock()
+
+    def fingerprint(self):
+        parts = ' UNION ALL '.join(
+            f"SELECT '{table}', MAX(_last_modified), COUNT(*) FROM {table}" for table in FINGERPRINT_TABLES
+        )
+        return tuple(self.pool.execute(parts))
+
+    def load(self):
+        fingerprint = self.fingerprint()
+        streams = {}
+        for row in self.pool.execute(INVENTORY_QUERY):
+            network, station, location, channel = (decode_text(value) for value in row[:4])
+            starts = [start for start in row[4::2] if start is not None]
+            ends = [end for end in row[5::2] if end is not None]
+            # A stream is active where all four levels of its epoch overlap
+            epoch = StreamEpoch(location, channel, max(starts) if starts else None, min(ends) if ends else None)
+            streams.setdefault(network, {}).setdefault(station, []).append(epoch)
+
+        stations = {}
+        for network, station in self.pool.execute(STATION_QUERY):
+            stations.setdefault(decode_text(network), set()).add(decode_text(station))
+        stations = {network: sorted(codes) for network, codes in stations.items()}
+
+        default_channels = {}
+        for network, station, channel_code, location_code in self.pool.execute(DEFAULT_CHANNELS_QUERY):
+            channel_code = append_z_if_needed(decode_text(channel_code))
+            location_code = decode_text(location_code)
+            # Use empty string for NULL or empty location codes
+            location_code = location_code if location_code and location_code.strip() else ''
+            default_channels[f"{network}.{station}"] = {
+                'channelCode': channel_code,
+                'locationCode': location_code
+            }
+
+        # Swap in the new state in one assignment so readers never see a mix
+        self.state = InventoryState(sorted(stations), stations, streams, default_channels, fingerprint)
+        self.loaded_at = time.monotonic()
+        print(f"Inventory loaded: {len(stations)} networks, "
+              f"{sum(len(codes) for codes in stations.values())} stations")
+
+    def refresh_if_stale(self):
+        # Non-blocking: returns at once, a background thread does the work
+        if time.monotonic() - self.loaded_at < self.ttl:
+            return
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def refresh(self):
+        try:
+            if self.fingerprint() != self.state.fingerprint:
+                self.load()
+            else:
+                self.loaded_at = time.monotonic()
+        except Error as e:
+            print(f"Error refreshing inventory: {e}")
+        finally:
+            self.refreshing = False
+
+    def networks(self):
+        self.refresh_if_stale()
+        return self.state.networks
+
+    def stations(self, network_codes):
+        self.refresh_if_stale()
+        state = self.state
+        return [(network, station) for network in sorted(network_codes)
+                for station in state.stations.get(network, [])]
+
+    def default_channels(self):
+        self.refresh_if_stale()
+        return self.state.default_channels
+
+    def stream_epochs(self, network_codes, station_codes):
+        state = self.state
+        station_codes = set(station_codes)
+        for network in network_codes:
+            for station, epochs in state.streams.get(network, {}).items():
+                if station in station_codes:
+                    for epoch in epochs:
+                        yield network, station, epoch
+
+    def locations_and_channels(self, network_codes, station_codes):
+        self.refresh_if_stale()
+        locations = set()
+        channels = set()
+        for _, _, epoch in self.stream_epochs(network_codes, station_codes):
+            if is_qc_channel(epoch.channel):
+                locations.add(epoch.location if epoch.location is not None else '--')
+                channels.add(epoch.channel)
+        return sorted(locations), sorted(channels)
+
+    def active_stations(self, network_codes, start_time, end_time):
+        # Stations with at least one QC channel whose epoch overlaps the window
+        self.refresh_if_stale()
+        start_time = to_datetime(start_time)
+        end_time = to_datetime(end_time)
+        state = self.state
+        active = set()
+        for network in network_codes:
+            for station, epochs in state.streams.get(network, {}).items():
+                for epoch in epochs:
+                    if not is_qc_channel(epoch.channel):
+                        continue
+                    if epoch.end is not None and epoch.end <= start_time:
+                        continue
+                    if epoch.start is not None and epoch.start > end_time:
+                        continue
+                    active.add((network, station))
+                    break
+        return sorted(active)
+
+
+def default_channel_codes(default_channel):
+    if default_channel.startswith(('EDH', 'BDF')):
+        return [default_channel]
+    elif len(default_channel) == 2:
+        return [default_channel + 'Z']
+    elif len(default_channel) == 3:
+        return [default_channel]
+    else:
+        return ['BHZ', 'HHZ', 'EHZ', 'SHZ', 'EDH', 'BDF']
+
+
+def build_stream_patterns(networks, stations, location_codes, channel_codes, default_channels):
+    # NSLC patterns for every network x station; empty location/channel
+    # lists fall back to the station's detecStream/detecLocid binding
+    stream_patterns = set()  # Use a set to avoid duplications
+    for network in networks:
+        for station in stations:
+            key = f"{network}.{station}"
+            default = default_channels.get(key, {'channelCode': 'BHZ', 'locationCode': ''})
+
+            locs = location_codes if location_codes else [default['locationCode']]
+            chans = channel_codes if channel_codes else default_channel_codes(default['channelCode'])
+
+            for loc in locs:
+                for chan in chans:
+                    loc_str = decode_text(loc) if loc else ''
+                    stream_patterns.add(f"{network}.{station}.{loc_str}.{decode_text(chan)}")
+
+    return stream_patterns
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+# Live tailing of the WaveformQuality table.
+#
+# Every poll asks only for rows whose _oid is above the highest one seen so
+# far. _oid grows with every insert, so late reports for old time windows
+# are picked up too, and the query is a primary key range scan however
+# large the table is.
+
+import time
+
+from qcfetch import WaveformQualityBackend
+from qcstore import QCSeriesStore, ns_to_query_time
+
+DAY_NS = 86400 * 10**9
+
+
+class LiveTail:
+    def __init__(self, pool, stream_patterns, parameters, qc_type='report'):
+        self.pool = pool
+        self.stream_patterns = sorted(stream_patterns)
+        self.parameters = parameters
+        self.backend = WaveformQualityBackend(pool=pool, qc_type=qc_type)
+        self.last_oid = None
+
+    def current_oid(self):
+        rows = self.pool.execute("SELECT MAX(_oid) FROM WaveformQuality")
+        return (rows[0][0] or 0) if rows else 0
+
+    def start(self):
+        # Call before the initial snapshot is fetched so no insert is missed
+        self.last_oid = self.current_oid()
+
+    def poll(self, start_ns):
+        # New rows since the last poll with a start time from start_ns on
+        if self.last_oid is None:
+            self.start()
+        self.backend.after_oid = self.last_oid
+        self.backend.last_oid = None
+        store = QCSeriesStore()
+        end_time = ns_to_query_time(time.time_ns() + DAY_NS)
+        for batch in self.backend.fetch_batches(self.stream_patterns, self.parameters,
+                                                ns_to_query_time(start_ns), end_time):
+            store.append_batch(batch)
+        if self.backend.last_oid is not None:
+            self.last_oid = max(self.last_oid, self.backend.last_oid)
+        return store
@@ -1,7 +1,6 @@
 import sys
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QComboBox, QDateTimeEdit, QLabel, QListWidget, QListWidgetItem, QAbstractItemView
-from PyQt5.QtCore import Qt
-import requests
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 import xml.etree.ElementTree as ET
 import datetime
 import subprocess
@@ -12,9 +11,31 @@ matplotlib.use('qt5agg')
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 
+from qcfdsn import FDSNError, FDSNStationClient
+
+# Seconds between background revalidations of the station inventory
+INVENTORY_REFRESH_INTERVAL = 300
+
+class InventoryRefreshThread(QThread):
+    inventory_changed = pyqtSignal()
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    def run(self):
+        try:
+            if self.client.refresh():
+                self.inventory_changed.emit()
+        except FDSNError as e:
+            self.error_occurred.emit(str(e))
+
 class MyApp(QWidget):
     def __init__(self):
         super().__init__()
+        self.fdsn_client = FDSNStationClient()
+        self.refresh_thread = None
         self.initUI()
 
     def initUI(self):
@@ -73,34 +94,51 @@ class MyApp(QWidget):
         self.station_code.currentIndexChanged.connect(self.update_location_codes)
         self.location_code.currentIndexChanged.connect(self.update_channel_codes)
 
-        self.update_network_codes()
-
-    def fetch_codes(self, url, column):
-        response = requests.get(url)
-        data = response.text.split("\n")
-        codes = [line.split("|")[column] for line in data if line]
-        return codes
+        # The inventory is fetched once in the background and revalidated
+        # periodically; the comboboxes are filled from the local tree
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh_inventory)
+        self.refresh_timer.start(INVENTORY_REFRESH_INTERVAL * 1000)
+        self.refresh_inventory()
+
+    def refresh_inventory(self):
+        if self.refresh_thread is not None and self.refresh_thread.isRunning():
+            return
+        self.refresh_thread = InventoryRefreshThread(self.fdsn_client)
+        self.refresh_thread.inventory_changed.connect(self.update_network_codes)
+        self.refresh_thread.error_occurred.connect(lambda message: print(f"Error fetching inventory: {message}"))
+        self.refresh_thread.start()
+
+    def reset_combobox(self, combobox, codes):
+        # Keep the current choice if it still exists after a refresh
+        current = combobox.currentText()
+        combobox.blockSignals(True)
+        combobox.clear()
+        combobox.addItems(codes)
+        if current in codes:
+            combobox.setCurrentIndex(codes.index(current))
+        combobox.blockSignals(False)
 
     def update_network_codes(self):
-        self.network_code.addItems(self.fetch_codes("http://localhost:8081/fdsnws/station/1/query?level=network&format=text&nodata=404", 0))
+        self.reset_combobox(self.network_code, self.fdsn_client.networks())
+        self.update_station_codes()
 
     def update_station_codes(self):
         network_code = self.network_code.currentText()
-        self.station_code.clear()
-        self.station_code.addItems(self.fetch_codes(f"http://localhost:8081/fdsnws/station/1/query?network={network_code}&level=station&format=text&nodata=404", 1))
+        self.reset_combobox(self.station_code, self.fdsn_client.stations(network_code))
+        self.update_location_codes()
 
     def update_location_codes(self):
         network_code = self.network_code.currentText()
         station_code = self.station_code.currentText()
-        self.location_code.clear()
-        self.location_code.addItems(self.fetch_codes(f"http://localhost:8081/fdsnws/station/1/query?network={network_code}&station={station_code}&level=channel&format=text&nodata=404", 2))
+        self.reset_combobox(self.location_code, self.fdsn_client.locations(network_code, station_code))
+        self.update_channel_codes()
 
     def update_channel_codes(self):
         network_code = self.network_code.currentText()
         station_code = self.station_code.currentText()
         location_code = self.location_code.currentText()
-        self.channel_code.clear()
-        self.channel_code.addItems(self.fetch_codes(f"http://localhost:8081/fdsnws/station/1/query?network={network_code}&station={station_code}&location={location_code}&level=channel&format=text&nodata=404", 3))
+        self.reset_combobox(self.channel_code, self.fdsn_client.channels(network_code, station_code, location_code))
 
     def parse_and_visualize(self, xml_data):
         # Parse the XML data
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+
+# Rendering helpers for QC time series plots.
+#
+# Decimation reduces a sorted series to a few points per screen pixel for
+# the currently visible x-range while keeping spikes: min-max keeps the
+# extremes of every pixel bin, LTTB keeps the points that span the largest
+# triangles. Both return indices into the full-resolution arrays.
+#
+# BatchedSeriesPlot draws any number of series with a handful of
+# collections that share one contiguous vertex array, so redraw cost
+# follows the number of vertices rather than the number of artists.
+#
+# The heatmap and distribution figures are built here on a given Figure,
+# so the GUI (Qt canvas) and the benchmarks (Agg canvas) draw the same way.
+
+import numpy as np
+import matplotlib.colors as mcolors
+import matplotlib.dates as mdates
+from matplotlib.collections import LineCollection, PolyCollection
+
+from qcstore import ns_to_datetime64
+
+
+def visible_slice(x, x0, x1):
+    # One extra point on each side so lines run to the edge of the axes
+    begin = max(int(np.searchsorted(x, x0, side='left')) - 1, 0)
+    end = min(int(np.searchsorted(x, x1, side='right')) + 1, len(x))
+    return begin, end
+
+
+def minmax_indices(x, y, n_bins, x0=None, x1=None):
+    begin, end = (0, len(x)) if x0 is None else visible_slice(x, x0, x1)
+    n = end - begin
+    if n <= 2 * n_bins:
+        return np.arange(begin, end)
+
+    xs = x[begin:end]
+    ys = y[begin:end]
+    low, high = xs[0], xs[-1]
+    if high <= low:
+        return np.arange(begin, end)
+
+    # x is sorted, so every pixel bin is a contiguous run of samples
+    edges = low + (high - low) * (np.arange(n_bins) / n_bins)
+    starts = np.unique(np.searchsorted(xs, edges, side='left'))
+    starts = starts[starts < n]
+    counts = np.diff(np.r_[starts, n])
+    bin_of = np.repeat(np.arange(len(starts)), counts)
+
+    # First sample in each bin that equals the bin minimum / maximum
+    mins = np.minimum.reduceat(ys, starts)
+    maxs = np.maximum.reduceat(ys, starts)
+    min_hits = np.flatnonzero(ys == mins[bin_of])
+    max_hits = np.flatnonzero(ys == maxs[bin_of])
+    min_first = min_hits[np.unique(bin_of[min_hits], return_index=True)[1]]
+    max_first = max_hits[np.unique(bin_of[max_hits], return_index=True)[1]]
+
+    indices = np.concatenate([min_first, max_first, [0, n - 1]])
+    return begin + np.unique(indices)
+
+
+def lttb_indices(x, y, n_out, x0=None, x1=None):
+    # Largest-Triangle-Three-Buckets
+    begin, end = (0, len(x)) if x0 is None else visible_slice(x, x0, x1)
+    n = end - begin
+    if n <= n_out or n_out < 3:
+        return np.arange(begin, end)
+
+    xs = x[begin:end]
+    ys = y[begin:end]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        b0, b1 = edges[i], edges[i + 1]
+        if i + 2 < n_out - 1:
+            c0, c1 = edges[i + 1], edges[i + 2]
+            avg_x = xs[c0:c1].mean()
+            avg_y = ys[c0:c1].mean()
+        else:
+            avg_x, avg_y = xs[n - 1], ys[n - 1]
+        area = np.abs((xs[a] - avg_x) * (ys[b0:b1] - ys[a]) - (xs[a] - xs[b0:b1]) * (avg_y - ys[a]))
+        a = b0 + int(np.argmax(area))
+        selected[i + 1] = a
+    return begin + selected
+
+
+DECIMATORS = {
+    'min-max': lambda x, y, pixels, x0=None, x1=None: minmax_indices(x, y, pixels, x0, x1),
+    'LTTB': lambda x, y, pixels, x0=None, x1=None: lttb_indices(x, y, 2 * pixels, x0, x1),
+}
+
+
+def decimate(x, y, pixels, method='min-max', x0=None, x1=None):
+    # Roughly 2 points per pixel of the visible range; 'off' keeps every point
+    if method == 'off':
+        return x, y
+    indices = DECIMATORS[method](x, y, pixels, x0, x1)
+    return x[indices], y[indices]
+
+
+def pack_vertices(series):
+    # One (N, 2) vertex array for all series plus the offset of each series
+    lengths = np.array([len(x) for x, _ in series], dtype=np.int64)
+    offsets = np.r_[0, np.cumsum(lengths)]
+    vertices = np.empty((offsets[-1], 2))
+    for (x, y), begin, end in zip(series, offsets[:-1], offsets[1:]):
+        vertices[begin:end, 0] = x
+        vertices[begin:end, 1] = y
+    return vertices, offsets
+
+
+class BatchedSeriesPlot:
+    """All stream x parameter series of a plot in one set of collections."""
+
+    def __init__(self, ax, plot_type, colors, markers, labels):
+        self.ax = ax
+        self.plot_type = plot_type
+        self.colors = np.zeros((0, 4))
+        self.labels = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+        self.lines = None
+        self.fill = None
+        if plot_type in ['line', 'area']:
+            self.lines = LineCollection([], linewidths=1.5)
+            ax.add_collection(self.lines)
+        if plot_type == 'area':
+            self.fill = PolyCollection([], edgecolors='none')
+            ax.add_collection(self.fill)
+
+        # One marker collection per marker shape
+        self.marker_size = 20 if plot_type == 'scatter' else 16
+        self.marker_groups = {}
+        self.marker_collections = {}
+        self.marker_offsets = {}
+        self.add_series(colors, markers, labels)
+
+    def add_series(self, colors, markers, labels):
+        # Register more series, e.g. streams that show up while a fetch is
+        # still running; their points come with the next set_series
+        first = len(self.labels)
+        self.colors = np.vstack([self.colors, mcolors.to_rgba_array(colors).reshape(-1, 4)])
+        self.labels.extend(labels)
+        if self.lines is not None:
+            self.lines.set_colors(self.colors)
+        if self.fill is not None:
+            fill_colors = self.colors.copy()
+            fill_colors[:, 3] = 0.3
+            self.fill.set_facecolors(fill_colors)
+        for index, marker in enumerate(markers, first):
+            if marker not in self.marker_collections:
+                self.marker_collections[marker] = self.ax.scatter([], [], marker=marker, s=self.marker_size)
+            self.marker_groups.setdefault(marker, []).append(index)
+
+    def set_series(self, series, autoscale=False):
+        vertices, offsets = pack_vertices(series)
+        lengths = np.diff(offsets)
+        self.offsets = offsets
+        segments = [vertices[begin:end] for begin, end in zip(offsets[:-1], offsets[1:])]
+
+        if self.lines is not None:
+            self.lines.set_segments(segments)
+        if self.fill is not None:
+            polygons = []
+            for segment in segments:
+                if len(segment):
+                    baseline = [[segment[0, 0], 0.0], [segment[-1, 0], 0.0]]
+                    polygons.append(np.vstack([baseline[:1], segment, baseline[1:]]))
+                else:
+                    polygons.append(np.empty((0, 2)))
+            self.fill.set_verts(polygons)
+
+        for marker, indices in self.marker_groups.items():
+            collection = self.marker_collections[marker]
+            points = np.concatenate([segments[index] for index in indices])
+            point_colors = np.repeat(self.colors[indices], lengths[indices], axis=0)
+            collection.set_offsets(points)
+            collection.set_facecolors(point_colors)
+            collection.set_edgecolors(point_colors)
+            self.marker_offsets[collection] = (indices, np.r_[0, np.cumsum(lengths[indices])])
+
+        if autoscale and len(vertices):
+            self.ax.update_datalim(vertices[np.isfinite(vertices).all(axis=1)])
+            self.ax.autoscale_view()
+
+    def hover_artists(self):
+        return list(self.marker_collections.values())
+
+    def label_for(self, collection, point_index):
+        # Map a point picked in a marker collection back to its series label
+        indices, offsets = self.marker_offsets[collection]
+        series = int(np.searchsorted(offsets, point_index, side='right')) - 1
+        return self.labels[indices[series]]
+
+
+# Heatmap bucket widths, finest first
+HEATMAP_BUCKETS = [60, 300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 86400, 7 * 86400]
+HEATMAP_AGGREGATIONS = ['mean', 'max', 'min', 'count']
+
+
+def choose_bucket(start_ns, end_ns, max_bins):
+    # Finest bucket width that keeps the number of columns within max_bins
+    span = max(end_ns - start_ns, 1)
+    for seconds in HEATMAP_BUCKETS:
+        if span / (seconds * 10**9) <= max_bins:
+            return seconds * 10**9
+    return HEATMAP_BUCKETS[-1] * 10**9
+
+
+def bin_heatmap(store, parameter, bucket_ns=None, max_bins=500, aggregation='mean', start_ns=None, end_ns=None):
+    """Aggregate one parameter into a stream x time-bucket matrix.
+
+    Returns (stream_keys, start_ns, bucket_ns, matrix); empty cells are NaN
+    (0 for 'count').
+    """
+    series = [(key, times, values) for key, param, times, values in store.items() if param == parameter]
+    series = [(key, times, values) for key, times, values in series if len(times)]
+    if not series:
+        return [], 0, bucket_ns or 1, np.empty((0, 0))
+
+    stream_keys = [key for key, _, _ in series]
+    times = np.concatenate([times for _, times, _ in series])
+    values = np.concatenate([values for _, _, values in series])
+    rows = np.repeat(np.arange(len(series)), [len(t) for _, t, _ in series])
+
+    if start_ns is None:
+        start_ns = int(times.min())
+    if end_ns is None:
+        end_ns = int(times.max()) + 1
+    if bucket_ns is None:
+        bucket_ns = choose_bucket(start_ns, end_ns, max_bins)
+    start_ns -= start_ns % bucket_ns
+    n_cols = max(int(-(-(end_ns - start_ns) // bucket_ns)), 1)
+
+    inside = (times >= start_ns) & (times < start_ns + n_cols * bucket_ns)
+    cells = rows[inside] * n_cols + (times[inside] - start_ns) // bucket_ns
+    values = values[inside]
+    size = len(series) * n_cols
+
+    counts = np.bincount(cells, minlength=size)
+    if aggregation == 'count':
+        matrix = counts.astype(np.float64)
+    elif aggregation == 'mean':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            matrix = np.bincount(cells, weights=values, minlength=size) / counts
+    else:
+        # max/min: reduce over runs of equal cells after a stable sort
+        order = np.argsort(cells, kind='stable')
+        cells = cells[order]
+        values = values[order]
+        matrix = np.full(size, np.nan)
+        if len(cells):
+            starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+            reduce = np.maximum if aggregation == 'max' else np.minimum
+            matrix[cells[starts]] = reduce.reduceat(values, starts)
+    return stream_keys, start_ns, bucket_ns, matrix.reshape(len(series), n_cols)
+
+
+def heatmap_layers(store, max_bins, aggregation='mean'):
+    # (parameter, stream_keys, start_ns, bucket_ns, matrix) per parameter with data
+    parameters = sorted({parameter for key in store.streams() for parameter in store.stream_parameters(key)})
+    heatmaps = []
+    for parameter in parameters:
+        stream_keys, start_ns, bucket_ns, matrix = bin_heatmap(store, parameter, max_bins=max_bins,
+                                                               aggregation=aggregation)
+        if matrix.size:
+            heatmaps.append((parameter, stream_keys, start_ns, bucket_ns, matrix))
+    return heatmaps
+
+
+def draw_heatmaps(fig, heatmaps, aggregation, normalize, log_scale):
+    # One imshow raster per parameter, stacked vertically
+    axes = fig.subplots(len(heatmaps), 1, squeeze=False)[:, 0]
+
+    for ax, (parameter, stream_keys, start_ns, bucket_ns, matrix) in zip(axes, heatmaps):
+        if normalize:
+            # Scale every stream to its own 0..1 range
+            low = np.nanmin(matrix, axis=1, keepdims=True)
+            high = np.nanmax(matrix, axis=1, keepdims=True)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                matrix = np.where(high > low, (matrix - low) / (high - low), 0.0)
+        norm = None
+        if log_scale:
+            positive = matrix[np.isfinite(matrix) & (matrix > 0)]
+            if len(positive):
+                norm = mcolors.LogNorm(vmin=positive.min(), vmax=positive.max())
+
+        n_rows, n_cols = matrix.shape
+        x0, x1 = mdates.date2num(ns_to_datetime64(np.array([start_ns, start_ns + n_cols * bucket_ns])))
+        image = ax.imshow(np.ma.masked_invalid(matrix), aspect='auto', interpolation='nearest',
+                          cmap='viridis', norm=norm, extent=[x0, x1, n_rows, 0])
+        ax.xaxis_date()
+        fig.colorbar(image, ax=ax, label=f"{parameter} ({aggregation})")
+
+        # Label every stream only while the labels stay readable
+        step = max(int(np.ceil(n_rows / 40)), 1)
+        rows = np.arange(0, n_rows, step)
+        ax.set_yticks(rows + 0.5)
+        ax.set_yticklabels([stream_keys[row] for row in rows], fontsize=7)
+        bucket_minutes = bucket_ns // (60 * 10**9)
+        bucket_label = (f"{bucket_minutes // 1440} d" if bucket_minutes >= 1440 else
+                        f"{bucket_minutes // 60} h" if bucket_minutes >= 60 else f"{bucket_minutes} min")
+        ax.set_title(f"{parameter}: {aggregation} per {bucket_label}")
+
+        if matrix.size <= 400:
+            cell_x = (x1 - x0) / n_cols
+            for row, column in zip(*np.nonzero(np.isfinite(matrix))):
+                ax.text(x0 + (column + 0.5) * cell_x, row + 0.5, f"{matrix[row, column]:.2f}",
+                        ha='center', va='center', fontsize=7, color='white')
+
+    fig.autofmt_xdate()
+
+
+def binned_kde(values, low, high, n_points=100, bins=256):
+    # Gaussian KDE evaluated on a histogram (Scott's bandwidth), so the
+    # cost is one pass over the samples plus a small convolution
+    coords = np.linspace(low, high, n_points)
+    if high <= low or len(values) < 2:
+        return coords, np.ones(n_points)
+    counts, edges = np.histogram(values, bins=bins, range=(low, high))
+    bin_width = edges[1] - edges[0]
+    bandwidth = 1.06 * np.std(values) * len(values) ** (-1 / 5)
+    sigma = max(bandwidth / bin_width, 0.5)
+    offsets = np.arange(-int(4 * sigma) - 1, int(4 * sigma) + 2)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    # Full convolution sliced back to the bins; 'same' would return the
+    # kernel's length when it is wider than the histogram
+    half = len(offsets) // 2
+    density = np.convolve(counts, kernel / kernel.sum())[half:half + bins] / (len(values) * bin_width)
+    centers = (edges[:-1] + edges[1:]) / 2
+    return coords, np.interp(coords, centers, density)
+
+
+def distribution_summary(values, label, max_fliers=200, kde_points=100):
+    """Box and violin statistics of one series.
+
+    The result holds the keys Axes.bxp expects (med, q1, q3, whislo,
+    whishi, fliers, mean, label) and those Axes.violin expects (coords,
+    vals, mean, median, min, max).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return None
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    low = values.min()
+    high = values.max()
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    whislo = inside.min() if len(inside) else q1
+    whishi = inside.max() if len(inside) else q3
+
+    # Keep only the most extreme outliers on each side
+    fliers = np.sort(values[(values < whislo) | (values > whishi)])
+    if len(fliers) > max_fliers:
+        fliers = np.r_[fliers[:max_fliers // 2], fliers[-(max_fliers // 2):]]
+
+    coords, density = binned_kde(values, low, high, kde_points)
+    mean = values.mean()
+    return {
+        'label': label, 'med': median, 'q1': q1, 'q3': q3, 'whislo': whislo, 'whishi': whishi,
+        'fliers': fliers, 'mean': mean, 'coords': coords, 'vals': density,
+        'median': median, 'min': low, 'max': high, 'count': len(values)
+    }
+
+
+def distribution_summaries(store):
+    # parameter -> distribution_summary per stream with data
+    summaries = {}
+    for key, parameter, _, values in store.items():
+        summary = distribution_summary(values, key)
+        if summary is not None:
+            summaries.setdefault(parameter, []).append(summary)
+    return summaries
+
+
+def draw_distributions(fig, summaries, plot_type, normalize, log_scale):
+    # Violin or box plot per parameter, one position per stream
+    axes = fig.subplots(len(summaries), 1, squeeze=False)[:, 0]
+
+    for ax, (parameter, stats) in zip(axes, sorted(summaries.items())):
+        if normalize:
+            # Map the parameter's overall range onto 0..1
+            low = min(summary['min'] for summary in stats)
+            high = max(summary['max'] for summary in stats)
+            scale = (high - low) or 1.0
+            for summary in stats:
+                for name in ('med', 'q1', 'q3', 'whislo', 'whishi', 'fliers', 'mean',
+                             'coords', 'median', 'min', 'max'):
+                    summary[name] = (summary[name] - low) / scale
+                summary['vals'] = summary['vals'] * scale
+
+        positions = np.arange(1, len(stats) + 1)
+        if plot_type == 'violin':
+            ax.violin(stats, positions=positions, widths=0.8, showmedians=True)
+        else:
+            ax.bxp(stats, positions=positions, showmeans=True, patch_artist=True,
+                   boxprops={'facecolor': 'lightsteelblue'},
+                   flierprops={'marker': '.', 'markersize': 2})
+
+        if log_scale:
+            positive = all(summary['min'] > 0 for summary in stats)
+            ax.set_yscale('log' if positive else 'symlog')
+
+        # Label every stream only while the labels stay readable
+        step = max(int(np.ceil(len(stats) / 60)), 1)
+        ax.set_xticks(positions[::step])
+        ax.set_xticklabels([summary['label'] for summary in stats[::step]], rotation=45, ha='right', fontsize=7)
+        ax.set_xlim(0.5, len(stats) + 0.5)
+        ax.set_ylabel(parameter)
+        ax.grid(True, axis='y', alpha=0.3)
+
+    axes[0].set_title(f"{plot_type.capitalize()} Plot of Quality Parameters")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# Station-average reports without the GUI.
+#
+# Uses the same inventory, stream pattern, fetch and aggregation code as
+# the Station Averages window of the visualizer, but never imports PyQt5 or
+# matplotlib, so it can run from cron. Networks are processed concurrently;
+# each network's fetch is additionally split into stream/time shards.
+#
+# Example (yesterday's report for two networks):
+#   ./qcreport.py -n AU,GE -o /var/tmp/qc_averages.csv
+#   ./qcreport.py --start "2024-01-01 00:00:00" --end "2024-01-02 00:00:00" -o qc.parquet
+
+import argparse
+import datetime
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from qcdb import ConnectionPool, Error
+from qcfetch import QC_PARAMETERS, FetchError, ScQueryQCBackend, ShardedBackend, WaveformQualityBackend
+from qcexport import EXPORT_FORMATS, ExportError, export_frame
+from qcinventory import InventoryIndex, build_stream_patterns
+from qccache import DEFAULT_CACHE_PATH, QCCache
+from qcstats import QUANTILES, StationAverages
+
+
+def station_averages(store, stations):
+    # Running statistics per station and parameter over all of its streams;
+    # stations without data are kept with no entries
+    averages = StationAverages(stations)
+    averages.add_batch(store)
+    return averages
+
+
+def average_table(averages):
+    # The Station Averages window columns plus spread and range
+    parameters = averages.parameters()
+    quantiles = [q for q, _ in QUANTILES]
+    columns = ['Station']
+    for param in parameters:
+        columns.extend([f"{param} (Avg)"] + [f"{param} ({label})" for _, label in QUANTILES]
+                       + [f"{param} (Std)", f"{param} (Min)", f"{param} (Max)", f"{param} (Count)"])
+    rows = []
+    for station, params in averages.items():
+        row = [station]
+        for param in parameters:
+            stats = params.get(param)
+            if stats is None or not stats.count:
+                row.extend([None] * (len(quantiles) + 4) + [0])
+            else:
+                row.extend([stats.average] + stats.quantiles(quantiles)
+                           + [stats.std(), stats.minimum, stats.maximum, stats.count])
+        rows.append(row)
+    return pd.DataFrame(rows, columns=columns)
+
+
+def network_averages(network, inventory, backend, parameters, start_time, end_time, cache=None):
+    stations = inventory.active_stations([network], start_time, end_time)
+    averages = StationAverages(stations)
+    if not stations:
+        return averages
+    stream_patterns = sorted(build_stream_patterns([network], [station for _, station in stations], [], [],
+                                                   inventory.default_channels()))
+
+    if cache is not None:
+        # Cached day buckets are aggregated as they are loaded
+        cache.fetch_into(averages, backend, stream_patterns, parameters, start_time, end_time)
+    else:
+        # Accumulate while fetching; batches are dropped right away
+        for batch in backend.fetch_batches(stream_patterns, parameters, start_time, end_time):
+            averages.add_batch(batch)
+    return averages
+
+
+def parse_arguments(argv):
+    today = datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    yesterday = today - datetime.timedelta(days=1)
+
+    parser = argparse.ArgumentParser(description="Write per-station QC parameter averages to CSV, Parquet or Arrow.")
+    parser.add_argument('-n', '--networks', help="Comma-separated network codes (default: all in inventory)")
+    parser.add_argument('-p', '--parameters', default=','.join(QC_PARAMETERS),
+                        help="Comma-separated QC parameters (default: all)")
+    parser.add_argument('-b', '--start', default=yesterday.strftime("%Y-%m-%d %H:%M:%S"),
+                        help="Start time 'YYYY-MM-DD HH:MM:SS' (default: start of yesterday, UTC)")
+    parser.add_argument('-e', '--end', default=today.strftime("%Y-%m-%d %H:%M:%S"),
+                        help="End time 'YYYY-MM-DD HH:MM:SS' (default: start of today, UTC)")
+    parser.add_argument('-o', '--output', required=True, help="Output file (.csv, .csv.gz, .parquet or .arrow)")
+    parser.add_argument('--format', choices=[name for name, _, _ in EXPORT_FORMATS],
+                        help="Output format (default: from file name)")
+    parser.add_argument('--source', choices=['database', 'scqueryqc'], default='database',
+                        help="Where QC records are read from (default: database)")
+    parser.add_argument('--network-workers', type=int, default=4, help="Networks processed at once (default: 4)")
+    parser.add_argument('--fetch-workers', type=int, default=min(os.cpu_count() or 1, 8),
+                        help="Fetch shards per network (default: CPU count, at most 8)")
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_PATH,
+                        help="Use the local QC cache (optionally at the given path)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    parameters = [param.strip() for param in args.parameters.split(',') if param.strip()]
+    network_workers = max(args.network_workers, 1)
+    fetch_workers = max(args.fetch_workers, 1)
+
+    pool = ConnectionPool(size=network_workers * fetch_workers + 1)
+    try:
+        inventory = InventoryIndex(pool, ttl=float('inf'))
+        try:
+            inventory.load()
+        except Error as e:
+            print(f"Error loading inventory: {e}", file=sys.stderr)
+            return 1
+
+        networks = args.networks.split(',') if args.networks else inventory.networks()
+        cache = QCCache(args.cache) if args.cache else None
+
+        def make_backend():
+            if args.source == 'database':
+                backend = WaveformQualityBackend(pool=pool)
+            else:
+                backend = ScQueryQCBackend()
+            if fetch_workers > 1:
+                backend = ShardedBackend(backend, fetch_workers)
+            return backend
+
+        started = time.monotonic()
+        averages = StationAverages()
+        failed = []
+        with ThreadPoolExecutor(max_workers=network_workers) as executor:
+            futures = {
+                executor.submit(network_averages, network, inventory, make_backend(), parameters,
+                                args.start, args.end, cache): network
+                for network in networks
+            }
+            for future in as_completed(futures):
+                network = futures[future]
+                try:
+                    network_result = future.result()
+                except (FetchError, Error) as e:
+                    print(f"Error processing network {network}: {e}", file=sys.stderr)
+                    failed.append(network)
+                    continue
+                averages.stats.update(network_result.stats)
+                print(f"{network}: {len(network_result.stats)} stations")
+
+        try:
+            export_frame(average_table(averages), args.output, args.format)
+        except (ExportError, OSError) as e:
+            print(f"Error writing report: {e}", file=sys.stderr)
+            return 1
+        print(f"Wrote {len(averages.stats)} stations to {args.output} in {time.monotonic() - started:.1f} s")
+        return 1 if failed else 0
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
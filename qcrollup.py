@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# Multi-resolution rollups (count/sum/sum of squares/min/max) of QC series.
+#
+# Rollups are kept next to the raw day buckets in the local cache and are
+# recomputed for a day whenever that day's raw data changes. Long time
+# ranges are then drawn from the coarsest level that still has about one
+# point per screen pixel, which keeps the cost independent of the span.
+
+from collections import namedtuple
+
+import numpy as np
+
+HOUR_NS = 3600 * 10**9
+DAY_NS = 86400 * 10**9
+
+# Finest first; every level divides a day so rollups can be rebuilt per day
+ROLLUP_RESOLUTIONS = [HOUR_NS, 6 * HOUR_NS, DAY_NS]
+
+RollupSeries = namedtuple('RollupSeries', ['times', 'count', 'total', 'sumsq', 'minimum', 'maximum'])
+
+
+def compute_rollup(times, values, resolution):
+    # times must be sorted; returns one entry per non-empty bucket
+    if len(times) == 0:
+        empty = np.empty(0)
+        return RollupSeries(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), empty, empty, empty, empty)
+    buckets = times // resolution
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    return RollupSeries(
+        buckets[starts] * resolution,
+        np.diff(np.r_[starts, len(times)]),
+        np.add.reduceat(values, starts),
+        np.add.reduceat(values * values, starts),
+        np.minimum.reduceat(values, starts),
+        np.maximum.reduceat(values, starts)
+    )
+
+
+def choose_resolution(start_ns, end_ns, pixels):
+    # Coarsest level that still gives at least one bucket per pixel,
+    # or None when even the finest level is too coarse and raw data is needed
+    span = end_ns - start_ns
+    for resolution in reversed(ROLLUP_RESOLUTIONS):
+        if span / resolution >= pixels:
+            return resolution
+    return None
+
+
+def create_rollup_table(connection):
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS rollup (
+        stream TEXT NOT NULL,
+        parameter TEXT NOT NULL,
+        resolution INTEGER NOT NULL,
+        bucket_ns INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        total REAL NOT NULL,
+        sumsq REAL NOT NULL,
+        minimum REAL NOT NULL,
+        maximum REAL NOT NULL,
+        PRIMARY KEY (stream, parameter, resolution, bucket_ns)
+    ) WITHOUT ROWID
+    """)
+
+
+def write_rollups(connection, stream, parameter, day_times, day_values):
+    # Recompute every level for one day of raw samples
+    for resolution in ROLLUP_RESOLUTIONS:
+        rollup = compute_rollup(day_times, day_values, resolution)
+        connection.executemany(
+            """
+            INSERT OR REPLACE INTO rollup
+                (stream, parameter, resolution, bucket_ns, count, total, sumsq, minimum, maximum)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(stream, parameter, resolution) + row for row in zip(
+                rollup.times.tolist(), rollup.count.tolist(), rollup.total.tolist(),
+                rollup.sumsq.tolist(), rollup.minimum.tolist(), rollup.maximum.tolist()
+            )]
+        )
+
+
+class RollupStore:
+    """Rollup counterpart of QCSeriesStore: series() yields bucket means."""
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.rollups = {}
+
+    def __len__(self):
+        return sum(len(rollup.times) for rollup in self.rollups.values())
+
+    def add(self, stream, parameter, rollup):
+        self.rollups[(stream, parameter)] = rollup
+
+    def streams(self):
+        seen = {}
+        for stream, _ in sorted(self.rollups):
+            seen.setdefault(stream, None)
+        return list(seen)
+
+    def stream_parameters(self, stream_key):
+        return [parameter for stream, parameter in sorted(self.rollups) if stream == stream_key]
+
+    def items(self):
+        for (stream, parameter), rollup in sorted(self.rollups.items()):
+            yield stream, parameter, rollup.times, rollup.total / rollup.count
+
+    def series(self, stream_key, parameter):
+        rollup = self.rollups[(stream_key, parameter)]
+        return rollup.times, rollup.total / rollup.count
+
+    def envelope(self, stream_key, parameter):
+        rollup = self.rollups[(stream_key, parameter)]
+        return rollup.minimum, rollup.maximum
+
+    def std(self, stream_key, parameter):
+        rollup = self.rollups[(stream_key, parameter)]
+        mean = rollup.total / rollup.count
+        return np.sqrt(np.maximum(rollup.sumsq / rollup.count - mean * mean, 0.0))
+
+    def nbytes(self):
+        return sum(array.nbytes for rollup in self.rollups.values() for array in rollup)
+
+
+def load_rollups(connection, stream_condition, stream_args, parameters, start_ns, end_ns, resolution, store):
+    placeholders = ', '.join(['?'] * len(parameters))
+    rows = connection.execute(
+        f"""
+        SELECT stream, parameter, bucket_ns, count, total, sumsq, minimum, maximum FROM rollup
+        WHERE {stream_condition} AND parameter IN ({placeholders})
+            AND resolution = ? AND bucket_ns BETWEEN ? AND ?
+        ORDER BY stream, parameter, bucket_ns
+        """,
+        list(stream_args) + list(parameters) + [resolution, start_ns - start_ns % resolution, end_ns]
+    ).fetchall()
+
+    # Rows arrive grouped by series; split them into column arrays
+    begin = 0
+    while begin < len(rows):
+        key = rows[begin][:2]
+        end = begin
+        while end < len(rows) and rows[end][:2] == key:
+            end += 1
+        columns = list(zip(*rows[begin:end]))
+        store.add(key[0], key[1], RollupSeries(
+            np.array(columns[2], dtype=np.int64),
+            np.array(columns[3], dtype=np.int64),
+            np.array(columns[4], dtype=np.float64),
+            np.array(columns[5], dtype=np.float64),
+            np.array(columns[6], dtype=np.float64),
+            np.array(columns[7], dtype=np.float64)
+        ))
+        begin = end
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+# SQLite stand-in for the SeisComP database.
+#
+# Holds the tables the query layer reads (inventory, trunk bindings and
+# WaveformQuality) with the SeisComP column names, and wraps sqlite3 in the
+# small part of the mysql.connector API that qcdb and qcfetch use: %s
+# placeholders, prepared/unbuffered cursors, ping and is_connected. Errors
+# are raised as mysql.connector.Error, so callers need no changes. LIKE
+# patterns get MySQL's default backslash escape, which SQLite lacks.
+# DATETIME columns come back as datetime objects like from MySQL; the
+# conversion is done by the cursor, so sqlite3's global adapters and
+# converters are left alone for other users of sqlite3 in the process.
+#
+# Point QC_SQLITE_DATABASE at a file to use it instead of MySQL; see
+# benchmarks/seiscompdb.py for filling one with a synthetic inventory.
+
+import datetime
+import itertools
+import os
+import re
+import sqlite3
+
+from mysql.connector import Error
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS PublicObject (
+    _oid INTEGER PRIMARY KEY,
+    publicID VARCHAR(255) NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS Network (
+    _oid INTEGER PRIMARY KEY,
+    _parent_oid INTEGER NOT NULL,
+    _last_modified DATETIME NOT NULL,
+    code CHAR(8) NOT NULL,
+    start DATETIME NOT NULL,
+    end DATETIME,
+    description VARCHAR(255)
+);
+CREATE TABLE IF NOT EXISTS Station (
+    _oid INTEGER PRIMARY KEY,
+    _parent_oid INTEGER NOT NULL,
+    _last_modified DATETIME NOT NULL,
+    code CHAR(8) NOT NULL,
+    start DATETIME NOT NULL,
+    end DATETIME,
+    latitude DOUBLE,
+    longitude DOUBLE,
+    elevation DOUBLE
+);
+CREATE TABLE IF NOT EXISTS SensorLocation (
+    _oid INTEGER PRIMARY KEY,
+    _parent_oid INTEGER NOT NULL,
+    _last_modified DATETIME NOT NULL,
+    code CHAR(8) NOT NULL,
+    start DATETIME NOT NULL,
+    end DATETIME
+);
+CREATE TABLE IF NOT EXISTS Stream (
+    _oid INTEGER PRIMARY KEY,
+    _parent_oid INTEGER NOT NULL,
+    _last_modified DATETIME NOT NULL,
+    code CHAR(8) NOT NULL,
+    start DATETIME NOT NULL,
+    end DATETIME,
+    sampleRateNumerator INTEGER,
+    sampleRateDenominator INTEGER
+);
+CREATE TABLE IF NOT EXISTS ConfigModule (
+    _oid INTEGER PRIMARY KEY,
+    _parent_oid INTEGER NOT NULL,
+    _last_modified DATETIME NOT NULL,
+    name VARCHAR(20) NOT NULL,
+    parameterSetID VARCHAR(255),
+    enabled INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ConfigStation (
+    _oid INTEGER PRIMARY KEY,
+    _parent_oid INTEGER NOT NULL,
+    _last_modified DATETIME NOT NULL,
+    networkCode CHAR(8) NOT NULL,
+    stationCode CHAR(8) NOT NULL,
+    enabled INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Setup (
+    _oid INTEGER PRIMARY KEY,
+    _parent_oid INTEGER NOT NULL,
+    _last_modified DATETIME NOT NULL,
+    name VARCHAR(255),
+    parameterSetID VARCHAR(255),
+    enabled INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Parameter (
+    _oid INTEGER PRIMARY KEY,
+    _parent_oid INTEGER NOT NULL,
+    _last_modified DATETIME NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    value BLOB
+);
+CREATE TABLE IF NOT EXISTS WaveformQuality (
+    _oid INTEGER PRIMARY KEY,
+    _parent_oid INTEGER NOT NULL,
+    _last_modified DATETIME NOT NULL,
+    waveformID_networkCode CHAR(8) NOT NULL,
+    waveformID_stationCode CHAR(8) NOT NULL,
+    waveformID_locationCode CHAR(8),
+    waveformID_channelCode CHAR(8),
+    creatorID VARCHAR(255) NOT NULL,
+    created DATETIME NOT NULL,
+    created_ms INTEGER NOT NULL,
+    start DATETIME NOT NULL,
+    start_ms INTEGER NOT NULL,
+    end DATETIME,
+    end_ms INTEGER,
+    type VARCHAR(255) NOT NULL,
+    parameter VARCHAR(255) NOT NULL,
+    value DOUBLE NOT NULL,
+    lowerUncertainty DOUBLE,
+    upperUncertainty DOUBLE,
+    windowLength DOUBLE
+);
+"""
+
+# The same indexes as the SeisComP MySQL schema, created after bulk loads
+INDEXES = """
+CREATE INDEX IF NOT EXISTS Network_parent ON Network(_parent_oid);
+CREATE INDEX IF NOT EXISTS Station_parent ON Station(_parent_oid);
+CREATE INDEX IF NOT EXISTS SensorLocation_parent ON SensorLocation(_parent_oid);
+CREATE INDEX IF NOT EXISTS Stream_parent ON Stream(_parent_oid);
+CREATE INDEX IF NOT EXISTS ConfigStation_parent ON ConfigStation(_parent_oid);
+CREATE INDEX IF NOT EXISTS Setup_parent ON Setup(_parent_oid);
+CREATE INDEX IF NOT EXISTS Parameter_parent ON Parameter(_parent_oid);
+CREATE INDEX IF NOT EXISTS WaveformQuality_start ON WaveformQuality(start, start_ms);
+CREATE INDEX IF NOT EXISTS WaveformQuality_end ON WaveformQuality(end, end_ms);
+CREATE UNIQUE INDEX IF NOT EXISTS WaveformQuality_composite ON WaveformQuality(
+    _parent_oid, start, start_ms, waveformID_networkCode, waveformID_stationCode,
+    waveformID_locationCode, waveformID_channelCode, type, parameter
+);
+"""
+
+# Result columns holding a DATETIME of the schema above
+DATETIME_COLUMNS = {'_last_modified', 'start', 'end', 'created'}
+
+connection_ids = itertools.count(1)
+
+LIKE_PLACEHOLDER = re.compile(r'\bLIKE\s+%s', re.IGNORECASE)
+
+
+def to_sqlite_time(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def from_sqlite_time(text):
+    return datetime.datetime.fromisoformat(text)
+
+
+class SQLiteCursor:
+    def __init__(self, connection):
+        self.cursor = connection.cursor()
+        self.datetime_columns = []
+
+    def execute(self, query, args=()):
+        args = [to_sqlite_time(arg) if isinstance(arg, datetime.datetime) else arg for arg in args]
+        query = LIKE_PLACEHOLDER.sub(r"LIKE ? ESCAPE '\\'", query)
+        try:
+            self.cursor.execute(query.replace('%s', '?'), args)
+        except sqlite3.Error as e:
+            raise Error(msg=str(e)) from e
+        self.datetime_columns = [index for index, column in enumerate(self.cursor.description or ())
+                                 if column[0] in DATETIME_COLUMNS]
+
+    def convert(self, rows):
+        if not self.datetime_columns:
+            return rows
+        converted = []
+        for row in rows:
+            row = list(row)
+            for index in self.datetime_columns:
+                if isinstance(row[index], str):
+                    row[index] = from_sqlite_time(row[index])
+            converted.append(tuple(row))
+        return converted
+
+    def fetchall(self):
+        try:
+            return self.convert(self.cursor.fetchall())
+        except sqlite3.Error as e:
+            raise Error(msg=str(e)) from e
+
+    def fetchmany(self, size):
+        try:
+            return self.convert(self.cursor.fetchmany(size))
+        except sqlite3.Error as e:
+            raise Error(msg=str(e)) from e
+
+    def close(self):
+        self.cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, path):
+        if not os.path.exists(path):
+            # sqlite3 would silently create an empty database
+            raise Error(msg=f"SQLite database not found: {path}")
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection_id = next(connection_ids)
+
+    def cursor(self, prepared=False, buffered=True):
+        # sqlite3 caches statements itself and always streams rows
+        return SQLiteCursor(self.connection)
+
+    def is_connected(self):
+        return self.connection is not None
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if self.connection is None:
+            if not reconnect:
+                raise Error(msg="Connection closed")
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection_id = next(connection_ids)
+
+    def interrupt(self):
+        # Safe to call from another thread; the running statement fails
+        if self.connection is not None:
+            self.connection.interrupt()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def connect_sqlite(path):
+    return SQLiteConnection(path)
+
+
+def create_database(path):
+    # Plain sqlite3 connection with the schema in place, for loading data;
+    # times have to be passed through to_sqlite_time
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def create_indexes(connection):
+    connection.executescript(INDEXES)
+    connection.execute("ANALYZE")
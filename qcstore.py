@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+# Columnar in-memory store for QC time series.
+#
+# Samples live in four parallel NumPy columns (stream id, parameter id,
+# epoch-ns time, value) that grow by doubling. Before reading, the columns
+# are reordered in place so that every stream x parameter series is a
+# contiguous, time-sorted slice; series() then hands out views instead of
+# copies.
+
+import numpy as np
+
+
+def datetimes_to_ns(times):
+    return np.array(times, dtype='datetime64[ns]').view(np.int64)
+
+
+def ns_to_datetime64(times_ns):
+    return times_ns.view('datetime64[ns]')
+
+
+def query_time_to_ns(text):
+    # "yyyy-MM-dd HH:mm:ss" as used for the fetch time window
+    return int(np.datetime64(text.replace(' ', 'T'), 'ns').astype(np.int64))
+
+
+def ns_to_query_time(time_ns):
+    return str(np.datetime64(int(time_ns), 'ns').astype('datetime64[s]')).replace('T', ' ')
+
+
+class QCSeriesStore:
+    def __init__(self, capacity=4096):
+        self.stream_keys = []
+        self.stream_index = {}
+        self.parameter_names = []
+        self.parameter_index = {}
+
+        self._stream_ids = np.empty(capacity, dtype=np.int32)
+        self._parameter_ids = np.empty(capacity, dtype=np.int32)
+        self._times = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+
+        # (stream_id, parameter_id) -> (begin, end) into the compacted columns
+        self._offsets = {}
+        self._compacted = True
+
+    def __len__(self):
+        return self.size
+
+    def stream_id(self, stream_key):
+        index = self.stream_index.get(stream_key)
+        if index is None:
+            index = len(self.stream_keys)
+            self.stream_index[stream_key] = index
+            self.stream_keys.append(stream_key)
+        return index
+
+    def parameter_id(self, parameter):
+        index = self.parameter_index.get(parameter)
+        if index is None:
+            index = len(self.parameter_names)
+            self.parameter_index[parameter] = index
+            self.parameter_names.append(parameter)
+        return index
+
+    def reserve(self, count):
+        needed = self.size + count
+        capacity = len(self._times)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('_stream_ids', '_parameter_ids', '_times', '_values'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def append(self, stream_key, parameter, times_ns, values):
+        # Append one batch of samples for a single series
+        count = len(values)
+        if count == 0:
+            return
+        self.reserve(count)
+        begin, end = self.size, self.size + count
+        self._stream_ids[begin:end] = self.stream_id(stream_key)
+        self._parameter_ids[begin:end] = self.parameter_id(parameter)
+        self._times[begin:end] = times_ns
+        self._values[begin:end] = values
+        self.size = end
+        self._compacted = False
+
+    def append_records(self, records):
+        # Append a batch of QCRecords from either fetch backend
+        count = len(records)
+        if count == 0:
+            return
+        self.reserve(count)
+        begin, end = self.size, self.size + count
+
+        stream_id = self.stream_id
+        parameter_id = self.parameter_id
+        self._stream_ids[begin:end] = [
+            stream_id(f"{r.network}.{r.station}.{r.location}.{r.channel}") for r in records
+        ]
+        self._parameter_ids[begin:end] = [parameter_id(r.parameter) for r in records]
+        self._times[begin:end] = datetimes_to_ns([r.time for r in records])
+        self._values[begin:end] = [r.value for r in records]
+        self.size = end
+        self._compacted = False
+
+    def extend(self, other):
+        # Append all samples of another store, e.g. the result of one fetch shard
+        stream_ids, parameter_ids, times, values = other.columns()
+        count = len(values)
+        if count == 0:
+            return
+        stream_map = np.array([self.stream_id(key) for key in other.stream_keys], dtype=np.int32)
+        parameter_map = np.array([self.parameter_id(name) for name in other.parameter_names], dtype=np.int32)
+        self.reserve(count)
+        begin, end = self.size, self.size + count
+        self._stream_ids[begin:end] = stream_map[stream_ids]
+        self._parameter_ids[begin:end] = parameter_map[parameter_ids]
+        self._times[begin:end] = times
+        self._values[begin:end] = values
+        self.size = end
+        self._compacted = False
+
+    def extend_new(self, other):
+        # Append only the samples of other whose stream, parameter and time
+        # are not in this store yet, e.g. live rows the snapshot already had.
+        # Returns the number of samples added.
+        added = QCSeriesStore()
+        for stream_key, parameter, times_ns, values in other.items():
+            existing, _ = self.series(stream_key, parameter)
+            if len(existing):
+                new = ~np.isin(times_ns, existing)
+                times_ns, values = times_ns[new], values[new]
+            added.append(stream_key, parameter, times_ns, values)
+        self.extend(added)
+        return len(added)
+
+    def append_batch(self, batch):
+        # Fetch batches are either lists of QCRecords or whole stores
+        if isinstance(batch, QCSeriesStore):
+            self.extend(batch)
+        else:
+            self.append_records(batch)
+
+    def shrink(self):
+        # Drop unused capacity, e.g. before sending the store to another process
+        for name in ('_stream_ids', '_parameter_ids', '_times', '_values'):
+            setattr(self, name, getattr(self, name)[:max(self.size, 1)].copy())
+
+    def compact(self):
+        # Sort the columns by (stream, parameter, time) and index the series
+        if self._compacted:
+            return
+        n = self.size
+        order = np.lexsort((self._times[:n], self._parameter_ids[:n], self._stream_ids[:n]))
+        for name in ('_stream_ids', '_parameter_ids', '_times', '_values'):
+            column = getattr(self, name)
+            column[:n] = column[:n][order]
+
+        self._offsets = {}
+        if n:
+            pairs = self._stream_ids[:n].astype(np.int64) << 32 | self._parameter_ids[:n]
+            starts = np.flatnonzero(np.r_[True, pairs[1:] != pairs[:-1]])
+            ends = np.r_[starts[1:], n]
+            for begin, end in zip(starts.tolist(), ends.tolist()):
+                key = (int(self._stream_ids[begin]), int(self._parameter_ids[begin]))
+                self._offsets[key] = (begin, end)
+        self._compacted = True
+
+    def trim_before(self, cutoff_ns):
+        # Drop samples older than cutoff_ns, e.g. to keep a rolling window
+        self.compact()
+        n = self.size
+        keep = self._times[:n] >= cutoff_ns
+        kept = int(np.count_nonzero(keep))
+        if kept == n:
+            return 0
+        for name in ('_stream_ids', '_parameter_ids', '_times', '_values'):
+            column = getattr(self, name)
+            column[:kept] = column[:n][keep]
+        self.size = kept
+        self._compacted = False
+        return n - kept
+
+    def latest_time(self):
+        return int(self._times[:self.size].max()) if self.size else None
+
+    def columns(self):
+        # Views of the compacted columns: stream ids, parameter ids, times, values
+        self.compact()
+        n = self.size
+        return self._stream_ids[:n], self._parameter_ids[:n], self._times[:n], self._values[:n]
+
+    def streams(self):
+        # Stream keys that have data, in order of first appearance
+        self.compact()
+        present = sorted({stream for stream, _ in self._offsets})
+        return [self.stream_keys[stream] for stream in present]
+
+    def stream_parameters(self, stream_key):
+        self.compact()
+        stream = self.stream_index.get(stream_key)
+        return [self.parameter_names[parameter]
+                for (s, parameter) in sorted(self._offsets) if s == stream]
+
+    def items(self):
+        # Iterate (stream_key, parameter, times_ns, values) over all series
+        self.compact()
+        for (stream, parameter), (begin, end) in sorted(self._offsets.items()):
+            yield (self.stream_keys[stream], self.parameter_names[parameter],
+                   self._times[begin:end], self._values[begin:end])
+
+    def series(self, stream_key, parameter):
+        self.compact()
+        key = (self.stream_index.get(stream_key), self.parameter_index.get(parameter))
+        begin, end = self._offsets.get(key, (0, 0))
+        return self._times[begin:end], self._values[begin:end]
+
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ('_stream_ids', '_parameter_ids', '_times', '_values'))
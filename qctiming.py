@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# Per-stage timing of a Run.
+#
+# A StageTimer collects wall time, row counts and bytes per named stage
+# (database query, scqueryqc output, XML parsing, plotting, ...). Stages
+# that run many times, such as per-batch parsing or several fetch shards,
+# are summed into one entry, so shard stages can add up to more than the
+# wall time of the fetch. Finished runs are appended to a JSON-lines log.
+
+import datetime
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+TIMING_LOG_PATH = os.environ.get(
+    'QC_TIMING_LOG', os.path.join(os.path.expanduser('~'), '.cache', 'qcparameters', 'timings.jsonl')
+)
+
+
+class SpanCounts:
+    # Filled in by the code inside a span
+    def __init__(self):
+        self.rows = 0
+        self.nbytes = 0
+
+
+class StageTimer:
+    def __init__(self, label):
+        self.label = label
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.started = time.perf_counter()
+        self.finished = None
+        self.error = None
+        # Selection details written to the log with the timings
+        self.context = {}
+        # stage -> [seconds, rows, bytes, calls], in order of first use
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds, rows=0, nbytes=0):
+        with self.lock:
+            entry = self.stages.setdefault(stage, [0.0, 0, 0, 0])
+            entry[0] += seconds
+            entry[1] += rows
+            entry[2] += nbytes
+            entry[3] += 1
+
+    @contextmanager
+    def span(self, stage):
+        counts = SpanCounts()
+        started = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            self.add(stage, time.perf_counter() - started, counts.rows, counts.nbytes)
+
+    def finish(self, error=None):
+        if self.finished is None:
+            self.finished = time.perf_counter()
+            self.error = error
+
+    @property
+    def total(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self):
+        with self.lock:
+            stages = list(self.stages.items())
+        return [
+            {'stage': stage, 'seconds': seconds, 'rows': rows, 'bytes': nbytes, 'calls': calls}
+            for stage, (seconds, rows, nbytes, calls) in stages
+        ]
+
+    def write_log(self, path=TIMING_LOG_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        entry = {
+            'label': self.label,
+            'started': self.started_at.strftime("%Y-%m-%d %H:%M:%S"),
+            'total_seconds': self.total,
+            'error': self.error,
+            'context': self.context,
+            'stages': self.summary(),
+        }
+        with open(path, 'a') as file:
+            file.write(json.dumps(entry) + '\n')
@@ -0,0 +1,43 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+# The qc* modules live at the top of the repository, next to the scripts;
+# the SQLite stand-in generator lives with the benchmarks
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from qcdb import ConnectionPool  # noqa: E402
+from seiscompdb import fill_database, synthetic_inventory  # noqa: E402
+
+QC_START = datetime.datetime(2024, 1, 1)
+N_STATIONS = 30
+DAYS = 2
+INTERVAL = 1800
+PARAMETERS = ['latency', 'delay', 'rms']
+
+
+@pytest.fixture(scope='session')
+def qc_database(tmp_path_factory):
+    # Small SeisComP stand-in: half-hourly reports for three parameters
+    path = str(tmp_path_factory.mktemp('seiscomp') / 'seiscomp.sqlite')
+    fill_database(path, N_STATIONS, DAYS, PARAMETERS, INTERVAL, QC_START)
+    return path
+
+
+@pytest.fixture(scope='session')
+def qc_streams():
+    # Stream ids with reports, as fill_database writes them
+    return sorted(f"{network}.{station}.{location}.{band}Z"
+                  for network, station, location, band, _, end, _ in synthetic_inventory(N_STATIONS, QC_START)
+                  if end is None)
+
+
+@pytest.fixture
+def qc_pool(qc_database):
+    pool = ConnectionPool(size=4, config={'sqlite': qc_database})
+    yield pool
+    pool.close()
@@ -0,0 +1,180 @@
+import time
+
+import pytest
+
+from qccache import SECOND_NS, QCCache, merge_intervals, subtract_intervals
+from qcdb import ConnectionPool
+from qcfetch import FetchCancelled, WaveformQualityBackend
+from qcstore import QCSeriesStore
+from seiscompdb import fill_database
+
+from conftest import INTERVAL, PARAMETERS, QC_START
+
+START = "2024-01-01 00:00:00"
+END = "2024-01-02 12:00:00"
+HOUR_NS = 3600 * SECOND_NS
+SOURCE = "database sqlite3:///test.sqlite type=report"
+
+
+def series(store):
+    return {(stream, parameter): (times.tolist(), values.tolist())
+            for stream, parameter, times, values in store.items()}
+
+
+def direct_fetch(backend, streams, parameters, start_time, end_time):
+    store = QCSeriesStore()
+    for batch in backend.fetch_batches(streams, parameters, start_time, end_time):
+        store.append_batch(batch)
+    return store
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return QCCache(str(tmp_path / 'cache.sqlite'))
+
+
+class CancellingBackend:
+    # Delivers the first batches of a real backend, then cancels
+    def __init__(self, backend, batches):
+        self.backend = backend
+        self.batches = batches
+        self.calls = []
+
+    def source_id(self):
+        return self.backend.source_id()
+
+    def fetch_batches(self, stream_patterns, parameters, start_time, end_time):
+        self.calls.append((list(stream_patterns), list(parameters), start_time, end_time))
+        fetched = self.backend.fetch_batches(stream_patterns, parameters, start_time, end_time)
+        for number, batch in enumerate(fetched):
+            if number == self.batches:
+                fetched.close()
+                raise FetchCancelled()
+            yield batch
+
+
+def test_merge_intervals():
+    assert merge_intervals([]) == []
+    assert merge_intervals([(5, 7), (1, 3), (2, 4)]) == [(1, 4), (5, 7)]
+    # Touching intervals join, a gap of one keeps them apart
+    assert merge_intervals([(1, 3), (3, 6), (7, 9)]) == [(1, 6), (7, 9)]
+    assert merge_intervals([(1, 10), (2, 3), (4, 5)]) == [(1, 10)]
+
+
+def test_subtract_intervals():
+    assert subtract_intervals(0, 10, []) == [(0, 10)]
+    assert subtract_intervals(0, 10, [(0, 10)]) == []
+    assert subtract_intervals(0, 10, [(-5, 20)]) == []
+    assert subtract_intervals(0, 10, [(2, 4), (6, 8)]) == [(0, 2), (4, 6), (8, 10)]
+    assert subtract_intervals(0, 10, [(-5, 3), (8, 15)]) == [(3, 8)]
+    # Intervals outside the range do not matter
+    assert subtract_intervals(0, 10, [(-9, -1), (12, 20)]) == [(0, 10)]
+
+
+def test_missing_ranges_groups_shared_gaps(cache):
+    connection = cache.connect(SOURCE)
+    try:
+        now = time.time_ns()
+        cache.mark_covered(connection, ['AA.S1..BHZ', 'AA.S2..BHZ'], ['rms'], 0, 10 * HOUR_NS, now)
+        cache.mark_covered(connection, ['AA.S1..BHZ'], ['rms'], 12 * HOUR_NS, 20 * HOUR_NS, now)
+        # Streams are grouped only where their gaps are identical
+        missing = cache.missing_ranges(connection, ['AA.S1..BHZ', 'AA.S2..BHZ'], ['rms', 'delay'],
+                                       0, 20 * HOUR_NS)
+    finally:
+        connection.close()
+    assert missing == [
+        (['AA.S1..BHZ', 'AA.S2..BHZ'], ['delay'], 0, 20 * HOUR_NS),
+        (['AA.S1..BHZ'], ['rms'], 10 * HOUR_NS, 12 * HOUR_NS),
+        (['AA.S2..BHZ'], ['rms'], 10 * HOUR_NS, 20 * HOUR_NS),
+    ]
+
+
+def test_mark_covered_leaves_unsettled_data_open(tmp_path):
+    cache = QCCache(str(tmp_path / 'cache.sqlite'), settle_time=3600)
+    connection = cache.connect(SOURCE)
+    try:
+        fetched_ns = 10 * HOUR_NS + 123
+        # Only up to one hour before the fetch (whole seconds) counts as final
+        cache.mark_covered(connection, ['AA.S1..BHZ'], ['rms'], 0, 12 * HOUR_NS, fetched_ns)
+        assert cache.covered_intervals(connection, 'AA.S1..BHZ', 'rms') == [(0, 9 * HOUR_NS)]
+        # A range that is entirely too recent is not recorded at all
+        cache.mark_covered(connection, ['AA.S2..BHZ'], ['rms'], 9 * HOUR_NS + 1, 12 * HOUR_NS, fetched_ns)
+        assert cache.covered_intervals(connection, 'AA.S2..BHZ', 'rms') == []
+        # Settled ranges are kept whole and merged with what is covered
+        cache.mark_covered(connection, ['AA.S1..BHZ'], ['rms'], 5 * HOUR_NS, 8 * HOUR_NS, 20 * HOUR_NS)
+        cache.mark_covered(connection, ['AA.S1..BHZ'], ['rms'], 9 * HOUR_NS, 11 * HOUR_NS, 20 * HOUR_NS)
+        assert cache.covered_intervals(connection, 'AA.S1..BHZ', 'rms') == [(0, 11 * HOUR_NS)]
+    finally:
+        connection.close()
+
+
+def test_cached_fetch_matches_direct_fetch(cache, qc_pool, qc_streams):
+    backend = WaveformQualityBackend(pool=qc_pool)
+    streams = qc_streams[:12]
+    expected = series(direct_fetch(backend, streams, PARAMETERS, START, END))
+    assert expected
+
+    # Part of the range first, so the second fetch has to fill gaps around it
+    partial = QCSeriesStore()
+    cache.fetch_into(partial, backend, streams[:5], PARAMETERS[:2], "2024-01-01 06:00:00", "2024-01-01 18:00:00")
+    assert series(partial) == series(direct_fetch(backend, streams[:5], PARAMETERS[:2],
+                                                  "2024-01-01 06:00:00", "2024-01-01 18:00:00"))
+
+    cold = QCSeriesStore()
+    missing = cache.fetch_into(cold, backend, streams, PARAMETERS, START, END)
+    assert missing
+    assert series(cold) == expected
+
+    warm = QCSeriesStore()
+    assert cache.fetch_into(warm, backend, streams, PARAMETERS, START, END) == []
+    assert series(warm) == expected
+
+
+def test_cancelled_fetch_keeps_samples_but_not_coverage(cache, qc_pool, qc_streams):
+    backend = WaveformQualityBackend(pool=qc_pool, fetch_size=100)
+    streams = qc_streams[:4]
+    cancelling = CancellingBackend(backend, batches=2)
+    store = QCSeriesStore()
+    with pytest.raises(FetchCancelled):
+        cache.fetch_into(store, cancelling, streams, PARAMETERS, START, END)
+    # The two batches delivered before the cancel are in the store and cache
+    assert len(store) == 200
+    connection = cache.connect(SOURCE)
+    try:
+        for stream in streams:
+            for parameter in PARAMETERS:
+                assert cache.covered_intervals(connection, stream, parameter) == []
+    finally:
+        connection.close()
+
+    # The next fetch asks for the whole range again and completes it
+    store = QCSeriesStore()
+    retry = CancellingBackend(backend, batches=None)
+    cache.fetch_into(store, retry, streams, PARAMETERS, START, END)
+    assert retry.calls == [(streams, sorted(PARAMETERS), START, END)]
+    assert series(store) == series(direct_fetch(backend, streams, PARAMETERS, START, END))
+
+
+def test_sources_are_cached_apart(cache, qc_pool, qc_streams, tmp_path):
+    # A second stand-in with the same stream codes but other values
+    other_path = str(tmp_path / 'other.sqlite')
+    fill_database(other_path, 10, 1, PARAMETERS, INTERVAL, QC_START, seed=1)
+    other_pool = ConnectionPool(size=2, config={'sqlite': other_path})
+    try:
+        streams = qc_streams[:3]
+        end_time = "2024-01-01 12:00:00"
+        backend = WaveformQualityBackend(pool=qc_pool)
+        other = WaveformQualityBackend(pool=other_pool)
+        assert backend.source_id() != other.source_id()
+        assert WaveformQualityBackend(pool=qc_pool, qc_type='alert').source_id() != backend.source_id()
+
+        first = QCSeriesStore()
+        cache.fetch_into(first, backend, streams, PARAMETERS, START, end_time)
+        second = QCSeriesStore()
+        # Nothing of the first database counts as covered for the second
+        assert cache.fetch_into(second, other, streams, PARAMETERS, START, end_time)
+        assert series(second) == series(direct_fetch(other, streams, PARAMETERS, START, end_time))
+        assert series(second) != series(first)
+        assert cache.count_missing(backend, streams, PARAMETERS, START, end_time) == 0
+    finally:
+        other_pool.close()
@@ -0,0 +1,101 @@
+import sqlite3
+
+import pytest
+
+from qcdb import IN_LIST_SIZES, Error, bind_query, padded_in_list, split_in_lists
+
+
+@pytest.mark.parametrize('count, size', [(1, 1), (2, 4), (4, 4), (5, 16), (17, 64), (1023, 1024), (1024, 1024)])
+def test_padded_in_list_sizes(count, size):
+    values = list(range(count))
+    padded = padded_in_list(values)
+    assert len(padded) == size
+    assert padded[:count] == values
+    # Padding repeats the last value, which leaves IN unchanged
+    assert set(padded) == set(values)
+
+
+def test_lists_beyond_the_largest_size_are_split():
+    limit = IN_LIST_SIZES[-1]
+    chunks = list(split_in_lists({'a': list(range(limit + 1))}))
+    assert [len(chunk['a']) for chunk in chunks] == [limit, 1]
+    assert sum((chunk['a'] for chunk in chunks), []) == list(range(limit + 1))
+    assert list(split_in_lists({'a': list(range(limit))})) == [{'a': list(range(limit))}]
+    assert list(split_in_lists({})) == [{}]
+
+    # Every chunk of one list is combined with every chunk of the other
+    chunks = list(split_in_lists({'a': list(range(limit + 1)), 'b': list(range(2 * limit + 5))}))
+    assert sorted((len(chunk['a']), len(chunk['b'])) for chunk in chunks) == [
+        (1, 5), (1, limit), (1, limit), (limit, 5), (limit, limit), (limit, limit)]
+
+
+def test_bind_query():
+    sql, args = bind_query("SELECT x FROM t WHERE a = %s AND b IN ({names}) AND c > %s",
+                           [1, 2], {'names': ['p', 'q', 'r', 's', 't']})
+    assert sql == "SELECT x FROM t WHERE a = %s AND b IN (" + ', '.join(['%s'] * 16) + ") AND c > %s"
+    assert args == [1, 'p', 'q', 'r', 's', 't'] + ['t'] * 11 + [2]
+
+    sql, args = bind_query("SELECT x FROM t WHERE b IN ({names})", in_lists={'names': []})
+    assert sql == "SELECT x FROM t WHERE b IN (NULL)"
+    assert args == []
+
+
+@pytest.mark.parametrize('count', [1, 4, 5, 1024, 1025, 3000])
+def test_split_lists_return_the_same_rows(qc_pool, qc_database, count):
+    connection = sqlite3.connect(qc_database)
+    try:
+        oids = [oid for oid, in connection.execute(
+            "SELECT _oid FROM WaveformQuality ORDER BY _oid LIMIT ?", (count,))]
+        expected = connection.execute(
+            "SELECT _oid, parameter, value FROM WaveformQuality WHERE _oid <= ? AND type = 'report'",
+            (oids[-1],)).fetchall()
+    finally:
+        connection.close()
+    rows = qc_pool.execute("SELECT _oid, parameter, value FROM WaveformQuality WHERE type = %s AND _oid IN ({oids})",
+                           ['report'], {'oids': oids})
+    assert sorted(rows) == sorted(expected)
+
+
+def test_pool_discards_connection_after_exception(qc_pool):
+    with qc_pool.connection() as pooled:
+        first = pooled
+    with pytest.raises(RuntimeError):
+        with qc_pool.connection() as pooled:
+            assert pooled is first
+            raise RuntimeError("query failed")
+    assert first.connection.connection is None
+    assert qc_pool.created == 0
+    with qc_pool.connection() as pooled:
+        assert pooled is not first
+    assert qc_pool.created == 1
+    assert qc_pool.execute("SELECT COUNT(*) FROM Network")[0][0] > 0
+
+
+def test_pool_reconnects_closed_connection(qc_pool):
+    qc_pool.execute("SELECT COUNT(*) FROM Network")
+    with qc_pool.connection() as pooled:
+        connection_id = pooled.connection.connection_id
+        assert pooled.statements
+        # e.g. a server-side timeout
+        pooled.connection.close()
+    with qc_pool.connection() as again:
+        assert again is pooled
+        assert again.connection.connection_id != connection_id
+        assert again.statements == {}
+    assert qc_pool.execute("SELECT COUNT(*) FROM Network")[0][0] > 0
+
+
+def test_pool_replaces_connection_after_failed_ping(qc_pool, monkeypatch):
+    with qc_pool.connection() as pooled:
+        old = pooled.connection
+    pooled.last_used = 0
+
+    def failing_ping(reconnect=False, attempts=1, delay=0):
+        raise Error(msg="Lost connection")
+
+    monkeypatch.setattr(old, 'ping', failing_ping)
+    with qc_pool.connection() as again:
+        assert again is pooled
+        assert again.connection is not old
+        assert old.connection is None
+    assert qc_pool.execute("SELECT COUNT(*) FROM Network")[0][0] > 0
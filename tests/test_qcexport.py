@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from qcexport import ExportError, export_chunks, export_series, series_chunks
+from qcstore import QCSeriesStore
+
+T0 = 1704067200 * 10**9
+
+ARROW_FORMATS = ['parquet', 'arrow']
+
+
+def sample_store():
+    rng = np.random.default_rng(3)
+    store = QCSeriesStore()
+    for station in ['A', 'B', 'C']:
+        for parameter in ['latency', 'rms']:
+            times = T0 + np.sort(rng.integers(0, 86400 * 10**9, 20))
+            store.append(f'AU.{station}..BHZ', parameter, times, rng.normal(size=20))
+    store.compact()
+    return store
+
+
+def read_export(path, file_format):
+    if file_format in ('csv', 'csv.gz'):
+        frame = pd.read_csv(path, float_precision='round_trip')
+        frame['time'] = pd.to_datetime(frame['time'])
+    elif file_format == 'parquet':
+        frame = pd.read_parquet(path)
+    else:
+        import pyarrow.ipc
+        with pyarrow.memory_map(str(path)) as source:
+            frame = pyarrow.ipc.open_file(source).read_pandas()
+    return frame
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'csv.gz'] + ARROW_FORMATS)
+def test_export_round_trip(tmp_path, file_format):
+    if file_format in ARROW_FORMATS:
+        pytest.importorskip('pyarrow')
+    store = sample_store()
+    path = tmp_path / f"export.{file_format}"
+    progress = []
+    # Small chunks, so several writes go to the same file
+    written = export_chunks(series_chunks(store, chunk_rows=7), str(path), file_format, len(store), progress.append)
+    assert written == len(store) == 120
+    assert progress[-1] == 100 and progress == sorted(progress)
+
+    frame = read_export(path, file_format)
+    stream_ids, parameter_ids, times_ns, values = store.columns()
+    assert list(frame.columns) == ['stream', 'parameter', 'time', 'value']
+    assert frame['stream'].astype(str).tolist() == [store.stream_keys[i] for i in stream_ids]
+    assert frame['parameter'].astype(str).tolist() == [store.parameter_names[i] for i in parameter_ids]
+    np.testing.assert_array_equal(frame['time'].to_numpy().astype('datetime64[ns]').astype(np.int64), times_ns)
+    np.testing.assert_array_equal(frame['value'].to_numpy(), values)
+
+
+def test_export_format_from_suffix(tmp_path):
+    path = tmp_path / "export.csv.gz"
+    assert export_series(sample_store(), str(path)) == 120
+    assert len(read_export(path, 'csv.gz')) == 120
+
+
+@pytest.mark.parametrize('file_format', ARROW_FORMATS)
+def test_arrow_errors_become_export_errors(tmp_path, file_format):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / f"export.{file_format}")
+    first = pd.DataFrame({'stream': ['AU.A..BHZ'], 'value': [1.0]})
+    # A later chunk that does not cast to the schema of the first
+    uncastable = pd.DataFrame({'stream': ['AU.A..BHZ'], 'value': ['not a number']})
+    with pytest.raises(ExportError):
+        export_chunks([first, uncastable], path, file_format)
+    # A column pyarrow cannot convert at all
+    mixed = pd.DataFrame({'stream': ['AU.A..BHZ', 'AU.B..BHZ'], 'value': [1.0, 'x']})
+    with pytest.raises(ExportError):
+        export_chunks([mixed], path, file_format)
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ExportError):
+        export_chunks([], str(tmp_path / "export.xlsx"), 'xlsx')
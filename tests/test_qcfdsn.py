@@ -0,0 +1,172 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from qcfdsn import FDSNError, FDSNStationClient, parse_channel_text
+
+HEADER = "#Network|Station|Location|Channel|Latitude|Longitude|Elevation|Depth|Azimuth|Dip|" \
+         "SensorDescription|Scale|ScaleFreq|ScaleUnits|SampleRate|StartTime|EndTime\n"
+INVENTORY = HEADER + """\
+AU|ARMA|00|BHZ|-30.4|151.6|0|0|0|-90|STS-2|1|1|M/S|40|2000-01-01T00:00:00|
+AU|ARMA|00|BHN|-30.4|151.6|0|0|0|0|STS-2|1|1|M/S|40|2000-01-01T00:00:00|
+AU|ARMA||HHZ|-30.4|151.6|0|0|0|-90|STS-2|1|1|M/S|100|2000-01-01T00:00:00|
+GE|WLF||BHZ|49.7|6.2|0|0|0|-90|STS-2|1|1|M/S|20|2000-01-01T00:00:00|
+"""
+
+
+class FDSNStationService:
+    # State of the stand-in service; tests change it between refreshes
+    def __init__(self):
+        self.status = 200
+        self.body = INVENTORY
+        self.etag = '"v1"'
+        self.last_modified = 'Mon, 01 Jan 2024 00:00:00 GMT'
+        self.requests = []
+
+
+class FDSNStationHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def do_GET(self):
+        service = self.server.service
+        service.requests.append((self.client_address, self.path, dict(self.headers)))
+        if not self.path.startswith('/fdsnws/station/1/query'):
+            self.reply(404)
+            return
+        if service.status != 200:
+            self.reply(service.status, b'Error')
+            return
+        etag_matches = service.etag and self.headers.get('If-None-Match') == service.etag
+        date_matches = (not service.etag and service.last_modified
+                        and self.headers.get('If-Modified-Since') == service.last_modified)
+        if etag_matches or date_matches:
+            self.reply(304)
+            return
+        self.reply(200, service.body.encode())
+
+    def reply(self, status, body=b''):
+        service = self.server.service
+        self.send_response(status)
+        if status in (200, 304):
+            if service.etag:
+                self.send_header('ETag', service.etag)
+            if service.last_modified:
+                self.send_header('Last-Modified', service.last_modified)
+        if status != 304:
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fdsn_service():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FDSNStationHandler)
+    server.service = FDSNStationService()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    server.service.url = f"http://127.0.0.1:{server.server_address[1]}/fdsnws/station/1/"
+    yield server.service
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(fdsn_service):
+    client = FDSNStationClient(fdsn_service.url, timeout=5)
+    yield client
+    client.close()
+
+
+def test_parse_channel_text():
+    tree = parse_channel_text(INVENTORY + "\nAU|ARMA|00|BHZ\nshort|line\n")
+    assert tree == {'AU': {'ARMA': {'00': ['BHN', 'BHZ'], '': ['HHZ']}}, 'GE': {'WLF': {'': ['BHZ']}}}
+
+
+def test_first_refresh_loads_tree(fdsn_service, client):
+    assert client.refresh() is True
+    assert client.networks() == ['AU', 'GE']
+    assert client.stations('AU') == ['ARMA']
+    assert client.locations('AU', 'ARMA') == ['', '00']
+    assert client.channels('AU', 'ARMA', '00') == ['BHN', 'BHZ']
+    assert client.channels('XX', 'ARMA', '00') == []
+    assert client.etag == '"v1"'
+    assert client.last_modified == fdsn_service.last_modified
+
+    _, path, headers = fdsn_service.requests[0]
+    assert path == '/fdsnws/station/1/query?level=channel&format=text&nodata=404'
+    assert 'If-None-Match' not in headers and 'If-Modified-Since' not in headers
+
+
+def test_unchanged_inventory_is_a_304(fdsn_service, client):
+    client.refresh()
+    tree = client.tree
+    assert client.refresh() is False
+    assert client.tree is tree
+
+    _, _, headers = fdsn_service.requests[-1]
+    assert headers['If-None-Match'] == '"v1"'
+    assert headers['If-Modified-Since'] == fdsn_service.last_modified
+    # Both requests went over the same kept-alive connection
+    assert len({address for address, _, _ in fdsn_service.requests}) == 1
+
+
+def test_last_modified_alone_gives_a_304(fdsn_service, client):
+    fdsn_service.etag = None
+    assert client.refresh() is True
+    assert client.etag is None
+    assert client.refresh() is False
+    _, _, headers = fdsn_service.requests[-1]
+    assert 'If-None-Match' not in headers
+    assert headers['If-Modified-Since'] == fdsn_service.last_modified
+
+
+def test_refresh_picks_up_changes(fdsn_service, client):
+    client.refresh()
+    fdsn_service.body = INVENTORY + "GE|WLF||HHZ|49.7|6.2|0|0|0|-90|STS-2|1|1|M/S|100|2000-01-01T00:00:00|\n"
+    fdsn_service.etag = '"v2"'
+    fdsn_service.last_modified = 'Tue, 02 Jan 2024 00:00:00 GMT'
+    assert client.refresh() is True
+    assert client.channels('GE', 'WLF', '') == ['BHZ', 'HHZ']
+    assert client.etag == '"v2"'
+    assert client.last_modified == 'Tue, 02 Jan 2024 00:00:00 GMT'
+
+    # A new validator with the same content is not a change
+    fdsn_service.etag = '"v3"'
+    assert client.refresh() is False
+    assert client.etag == '"v3"'
+
+
+def test_nodata_empties_tree(fdsn_service, client):
+    client.refresh()
+    fdsn_service.status = 404
+    assert client.refresh() is True
+    assert client.networks() == []
+    assert client.etag is None
+
+
+def test_server_errors_raise(fdsn_service, client):
+    client.refresh()
+    fdsn_service.status = 500
+    with pytest.raises(FDSNError, match='HTTP 500'):
+        client.refresh()
+    # The cached tree and validators stay usable
+    assert client.networks() == ['AU', 'GE']
+    assert client.etag == '"v1"'
+
+
+def test_unreachable_service_raises():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FDSNStationHandler)
+    port = server.server_address[1]
+    server.server_close()
+    client = FDSNStationClient(f"http://127.0.0.1:{port}/fdsnws/station/1", timeout=2)
+    try:
+        with pytest.raises(FDSNError):
+            client.refresh()
+    finally:
+        client.close()
@@ -0,0 +1,245 @@
+import datetime
+import os
+import stat
+
+import numpy as np
+import pytest
+
+from qcfetch import (
+    FetchError, QCRecord, ScQueryQCBackend, ScQueryQCParser, ShardedBackend, WaveformQualityBackend, wildcard_to_like
+)
+from qcsqlite import connect_sqlite, create_database
+from qcstore import QCSeriesStore, query_time_to_ns
+from qcsynth import SCHEMA_VERSIONS, synthetic_xml
+
+from conftest import PARAMETERS
+
+# Stand-in for scqueryqc: a lot of log output on stderr, then the XML
+SCQUERYQC = """#!/bin/sh
+head -c 200000 /dev/zero | tr '\\0' x >&2
+cat "$QC_TEST_OUTPUT"
+exit "$QC_TEST_STATUS"
+"""
+
+SECOND_NS = 10**9
+
+
+def series(store):
+    return {(stream, parameter): (times.tolist(), values.tolist())
+            for stream, parameter, times, values in store.items()}
+
+
+def fetch_store(backend, streams, parameters, start_time, end_time):
+    store = QCSeriesStore()
+    for batch in backend.fetch_batches(streams, parameters, start_time, end_time):
+        store.append_batch(batch)
+    return store
+
+
+@pytest.mark.parametrize('start_time, end_time', [
+    ("2024-01-01 00:00:00", "2024-01-01 02:00:00"),
+    ("2024-01-01 00:00:00", "2024-01-01 00:00:03"),
+    ("2024-01-01 00:00:07", "2024-01-02 13:21:59"),
+    ("2024-01-01 00:00:00", "2024-01-01 00:00:00"),
+])
+@pytest.mark.parametrize('n_streams', [1, 3, 40])
+def test_shards_cover_range_once(start_time, end_time, n_streams):
+    streams = [f"AA.S{index:04d}..BHZ" for index in range(n_streams)]
+    sharded = ShardedBackend(WaveformQualityBackend(), max_workers=2)
+    shards = sharded.shards(streams, PARAMETERS, start_time, end_time)
+
+    # Every stream is in exactly one stream chunk
+    chunks = {tuple(shard_streams) for shard_streams, _, _, _ in shards}
+    assert sorted(stream for chunk in chunks for stream in chunk) == streams
+
+    for chunk in chunks:
+        slices = sorted((query_time_to_ns(begin), query_time_to_ns(end))
+                        for shard_streams, _, begin, end in shards if tuple(shard_streams) == chunk)
+        # Slices start at the start time, end on the (inclusive) end time
+        # and leave exactly one second between each other
+        assert slices[0][0] == query_time_to_ns(start_time)
+        assert slices[-1][1] == query_time_to_ns(end_time)
+        for (_, previous_end), (next_start, _) in zip(slices, slices[1:]):
+            assert next_start == previous_end + SECOND_NS
+        assert all(begin <= end for begin, end in slices)
+
+
+def test_no_streams_no_shards(qc_pool):
+    sharded = ShardedBackend(WaveformQualityBackend(pool=qc_pool), max_workers=2)
+    assert sharded.shards([], PARAMETERS, "2024-01-01 00:00:00", "2024-01-02 00:00:00") == []
+    assert list(sharded.fetch_batches([], PARAMETERS, "2024-01-01 00:00:00", "2024-01-02 00:00:00")) == []
+
+
+def test_slice_boundaries_on_whole_seconds():
+    sharded = ShardedBackend(WaveformQualityBackend(), max_workers=2, shards_per_worker=2)
+    shards = sharded.shards(['AA.S0001..BHZ'], PARAMETERS, "2024-01-01 00:00:00", "2024-01-01 02:00:00")
+    assert [(begin, end) for _, _, begin, end in shards] == [
+        ("2024-01-01 00:00:00", "2024-01-01 00:29:59"),
+        ("2024-01-01 00:30:00", "2024-01-01 00:59:59"),
+        ("2024-01-01 01:00:00", "2024-01-01 01:29:59"),
+        ("2024-01-01 01:30:00", "2024-01-01 02:00:00"),
+    ]
+
+
+@pytest.mark.parametrize('n_streams', [1, 5, 20])
+@pytest.mark.parametrize('start_time, end_time', [
+    # Reports are half-hourly, so these ranges put samples on slice
+    # boundaries and on the inclusive end time
+    ("2024-01-01 00:00:00", "2024-01-01 02:00:00"),
+    ("2024-01-01 00:00:00", "2024-01-02 12:00:00"),
+    ("2024-01-01 00:10:01", "2024-01-01 23:30:00"),
+])
+def test_sharded_fetch_matches_unsharded(qc_pool, qc_streams, n_streams, start_time, end_time):
+    streams = qc_streams[:n_streams]
+    backend = WaveformQualityBackend(pool=qc_pool)
+    expected = series(fetch_store(backend, streams, PARAMETERS, start_time, end_time))
+    assert expected
+
+    sharded = ShardedBackend(WaveformQualityBackend(pool=qc_pool), max_workers=3)
+    assert series(fetch_store(sharded, streams, PARAMETERS, start_time, end_time)) == expected
+    assert sharded.shards_done == sharded.shards_total > 1
+
+
+def test_sharded_fetch_with_wildcards(qc_pool, qc_streams):
+    network = qc_streams[0].split('.')[0]
+    patterns = [f"{network}.*.*.*Z"]
+    start_time, end_time = "2024-01-01 00:00:00", "2024-01-01 06:00:00"
+    backend = WaveformQualityBackend(pool=qc_pool)
+    expected = series(fetch_store(backend, patterns, PARAMETERS, start_time, end_time))
+    assert {stream.split('.')[0] for stream, _ in expected} == {network}
+
+    sharded = ShardedBackend(WaveformQualityBackend(pool=qc_pool), max_workers=4)
+    assert series(fetch_store(sharded, patterns, PARAMETERS, start_time, end_time)) == expected
+
+
+@pytest.fixture
+def scqueryqc(tmp_path, monkeypatch):
+    directory = tmp_path / 'bin'
+    directory.mkdir()
+    script = directory / 'scqueryqc'
+    script.write_text(SCQUERYQC)
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+    output = tmp_path / 'qc.xml'
+    output.write_bytes(b''.join(synthetic_xml(4, PARAMETERS, 6)))
+    monkeypatch.setenv('PATH', f"{directory}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('QC_TEST_OUTPUT', str(output))
+    monkeypatch.setenv('QC_TEST_STATUS', '0')
+    return monkeypatch
+
+
+
+@pytest.mark.parametrize('pattern, expected', [
+    ('A_1', ['A_1']),
+    ('A%1', ['A%1']),
+    ('A\\1', ['A\\1']),
+    ('A?1', ['A%1', 'AX1', 'A\\1', 'A_1']),
+    ('A*', ['A%1', 'AX1', 'AXX1', 'A\\1', 'A_1']),
+])
+def test_like_patterns_match_literally(tmp_path, pattern, expected):
+    # The stand-in escapes LIKE patterns with a backslash like MySQL does
+    path = str(tmp_path / 'like.sqlite')
+    database = create_database(path)
+    for oid, code in enumerate(['A_1', 'AX1', 'A%1', 'AXX1', 'A\\1']):
+        database.execute("INSERT INTO Network (_oid, _parent_oid, _last_modified, code, start) "
+                         "VALUES (?, 0, '2024-01-01 00:00:00', ?, '2024-01-01 00:00:00')", (oid, code))
+    database.commit()
+    database.close()
+    connection = connect_sqlite(path)
+    cursor = connection.cursor()
+    cursor.execute("SELECT code FROM Network WHERE code like %s ORDER BY code", [wildcard_to_like(pattern)])
+    assert [code for code, in cursor.fetchall()] == sorted(expected)
+    connection.close()
+
+
+def test_scqueryqc_with_large_stderr(scqueryqc):
+    # More stderr than a pipe holds must not stall the fetch
+    backend = ScQueryQCBackend('sqlite3:///nowhere.sqlite')
+    store = fetch_store(backend, ['*.*.*.*'], PARAMETERS, "2024-01-01 00:00:00", "2024-01-01 06:00:00")
+    assert len(store) == 4 * len(PARAMETERS) * 36
+
+
+def test_scqueryqc_failure_reports_stderr(scqueryqc):
+    scqueryqc.setenv('QC_TEST_STATUS', '1')
+    backend = ScQueryQCBackend('sqlite3:///nowhere.sqlite')
+    with pytest.raises(FetchError) as error:
+        fetch_store(backend, ['*.*.*.*'], PARAMETERS, "2024-01-01 00:00:00", "2024-01-01 06:00:00")
+    assert str(error.value).endswith('x' * 1000)
+
+
+def parse_pieces(pieces, parameters=None):
+    parser = ScQueryQCParser(parameters)
+    records = []
+    for piece in pieces:
+        records.extend(parser.feed(piece))
+    records.extend(parser.close())
+    return records
+
+
+def split_at(document, positions):
+    positions = [0] + sorted(positions) + [len(document)]
+    return [document[begin:end] for begin, end in zip(positions, positions[1:])]
+
+
+@pytest.mark.parametrize('version', SCHEMA_VERSIONS)
+def test_parser_reads_both_schema_versions(version):
+    document = b''.join(synthetic_xml(3, PARAMETERS, 1, version))
+    assert f"seiscomp3-schema/{version}".encode() in document
+    records = parse_pieces([document])
+    # 3 streams x 3 parameters x 6 ten-minute windows
+    assert len(records) == 3 * len(PARAMETERS) * 6
+    first = records[0]
+    assert first == QCRecord('AU', 'S0000', '00', 'BHZ', PARAMETERS[0], datetime.datetime(2024, 1, 1),
+                             first.value)
+    assert {record.parameter for record in records} == set(PARAMETERS)
+
+
+def test_schema_versions_give_the_same_records():
+    records = [parse_pieces([b''.join(synthetic_xml(4, PARAMETERS, 2, version))]) for version in SCHEMA_VERSIONS]
+    assert records[0] == records[1]
+
+
+@pytest.mark.parametrize('version', SCHEMA_VERSIONS)
+@pytest.mark.parametrize('seed', range(5))
+def test_parser_handles_any_split(version, seed):
+    document = b''.join(synthetic_xml(3, PARAMETERS, 2, version))
+    expected = parse_pieces([document])
+    rng = np.random.default_rng(seed)
+    positions = rng.choice(np.arange(1, len(document)), size=50, replace=False).tolist()
+    assert parse_pieces(split_at(document, positions)) == expected
+    # One byte at a time for the start of the document
+    head = 2000
+    assert parse_pieces([document[i:i + 1] for i in range(head)] + [document[head:]]) == expected
+
+
+def test_parser_splits_inside_names_and_attributes():
+    document = b''.join(synthetic_xml(2, PARAMETERS, 1))
+    expected = parse_pieces([document])
+    positions = []
+    for marker, offset in [(b'<waveformQuality>', 5), (b'stationCode="', 3), (b'stationCode="', 14),
+                           (b'</waveformQuality>', 9), (b'<value>', 8), (b'xmlns="', 20)]:
+        start = 0
+        while True:
+            index = document.find(marker, start)
+            if index < 0:
+                break
+            positions.append(index + offset)
+            start = index + 1
+    pieces = split_at(document, sorted(set(positions)))
+    assert len(pieces) > 50
+    assert parse_pieces(pieces) == expected
+
+
+def test_parser_waits_for_complete_elements():
+    document = b''.join(synthetic_xml(1, PARAMETERS[:1], 1))
+    cut = document.find(b'</waveformQuality>') + 5
+    parser = ScQueryQCParser()
+    assert parser.feed(document[:cut]) == []
+    records = parser.feed(document[cut:]) + parser.close()
+    assert len(records) == 6
+
+
+def test_parser_filters_parameters():
+    document = b''.join(synthetic_xml(2, PARAMETERS, 1))
+    records = parse_pieces([document], PARAMETERS[1:2])
+    assert len(records) == 2 * 6
+    assert {record.parameter for record in records} == {PARAMETERS[1]}
@@ -0,0 +1,65 @@
+import datetime
+import sqlite3
+
+import numpy as np
+
+from qcdb import ConnectionPool
+from qcfetch import WaveformQualityBackend
+from qclive import LiveTail
+from qcstore import QCSeriesStore, query_time_to_ns
+from seiscompdb import fill_database, write_reports
+
+from conftest import INTERVAL, PARAMETERS, QC_START
+
+
+def fetch_store(backend, streams, parameters, start_time, end_time):
+    store = QCSeriesStore()
+    for batch in backend.fetch_batches(streams, parameters, start_time, end_time):
+        store.append_batch(batch)
+    return store
+
+
+def test_extend_new_skips_known_samples():
+    store = QCSeriesStore()
+    store.append('AA.S1..BHZ', 'rms', np.array([10, 20, 30]), np.array([1.0, 2.0, 3.0]))
+    batch = QCSeriesStore()
+    batch.append('AA.S1..BHZ', 'rms', np.array([20, 30, 40]), np.array([2.0, 3.0, 4.0]))
+    batch.append('AA.S1..BHZ', 'delay', np.array([20]), np.array([5.0]))
+    assert store.extend_new(batch) == 2
+    assert store.series('AA.S1..BHZ', 'rms')[0].tolist() == [10, 20, 30, 40]
+    assert store.series('AA.S1..BHZ', 'delay')[1].tolist() == [5.0]
+    assert store.extend_new(batch) == 0
+
+
+def test_rows_inserted_before_the_snapshot_are_added_once(tmp_path):
+    path = str(tmp_path / 'seiscomp.sqlite')
+    fill_database(path, 4, 1, PARAMETERS, INTERVAL, QC_START)
+    pool = ConnectionPool(size=2, config={'sqlite': path})
+    try:
+        streams = sorted(f"{net}.{sta}.{loc}.{cha}" for net, sta, loc, cha in pool.execute(
+            "SELECT DISTINCT waveformID_networkCode, waveformID_stationCode, waveformID_locationCode, "
+            "waveformID_channelCode FROM WaveformQuality"))
+        tail = LiveTail(pool, streams, PARAMETERS)
+        tail.start()
+
+        # A report window arrives after start() but before the snapshot
+        connection = sqlite3.connect(path)
+        codes = [tuple(stream.split('.')) for stream in streams]
+        write_reports(connection, codes, PARAMETERS, QC_START + datetime.timedelta(days=1), INTERVAL / 86400,
+                      INTERVAL, 1)
+        connection.commit()
+        connection.close()
+
+        end_time = "2024-01-02 00:00:00"
+        snapshot = fetch_store(WaveformQualityBackend(pool=pool), streams, PARAMETERS, "2024-01-01 00:00:00", end_time)
+        new_rows = len(streams) * len(PARAMETERS)
+        assert len(snapshot) == (86400 // INTERVAL + 1) * new_rows
+
+        # The first poll returns the window again; appending adds nothing
+        batch = tail.poll(query_time_to_ns("2024-01-01 00:00:00"))
+        assert len(batch) == new_rows
+        assert snapshot.extend_new(batch) == 0
+        assert len(snapshot) == (86400 // INTERVAL + 1) * new_rows
+        assert len(tail.poll(query_time_to_ns("2024-01-01 00:00:00"))) == 0
+    finally:
+        pool.close()
@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+
+from qcrender import (
+    HEATMAP_AGGREGATIONS, bin_heatmap, binned_kde, decimate, distribution_summary, lttb_indices, minmax_indices
+)
+from qcstore import QCSeriesStore
+
+
+def random_series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.cumsum(rng.uniform(0.5, 1.5, n))
+    y = rng.normal(size=n)
+    # A few spikes that decimation has to keep
+    y[rng.choice(n, 5, replace=False)] = rng.choice([-50.0, 50.0], 5)
+    return x, y
+
+
+@pytest.mark.parametrize('n, n_bins', [(10000, 100), (5001, 37), (201, 100)])
+def test_minmax_keeps_ends_and_bin_extremes(n, n_bins):
+    x, y = random_series(n)
+    indices = minmax_indices(x, y, n_bins)
+    assert np.all(np.diff(indices) > 0)
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert len(indices) <= 2 * n_bins + 2
+
+    kept = set(indices.tolist())
+    edges = x[0] + (x[-1] - x[0]) * (np.arange(n_bins + 1) / n_bins)
+    bins = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, n_bins - 1)
+    for b in np.unique(bins):
+        members = np.flatnonzero(bins == b)
+        kept_y = y[sorted(kept & set(members.tolist()))]
+        assert y[members].min() == kept_y.min()
+        assert y[members].max() == kept_y.max()
+    assert y.min() in y[indices] and y.max() in y[indices]
+
+
+@pytest.mark.parametrize('n, n_out', [(10000, 200), (5001, 37), (101, 100), (100, 3)])
+def test_lttb_keeps_ends_and_length(n, n_out):
+    x, y = random_series(n)
+    indices = lttb_indices(x, y, n_out)
+    assert len(indices) == n_out
+    assert np.all(np.diff(indices) > 0)
+    assert indices[0] == 0 and indices[-1] == n - 1
+
+
+def test_short_series_pass_through():
+    x, y = random_series(50)
+    assert np.array_equal(minmax_indices(x, y, 25), np.arange(50))
+    assert np.array_equal(minmax_indices(x, y, 100), np.arange(50))
+    assert np.array_equal(lttb_indices(x, y, 50), np.arange(50))
+    assert np.array_equal(lttb_indices(x, y, 100), np.arange(50))
+    for method in ['min-max', 'LTTB', 'off']:
+        dx, dy = decimate(x, y, 100, method)
+        assert np.array_equal(dx, x) and np.array_equal(dy, y)
+    empty = np.array([])
+    for method in ['min-max', 'LTTB']:
+        dx, dy = decimate(empty, empty, 100, method)
+        assert len(dx) == 0 and len(dy) == 0
+
+
+@pytest.mark.parametrize('method', ['min-max', 'LTTB'])
+def test_decimate_bounds_output(method):
+    x, y = random_series(100000)
+    pixels = 500
+    dx, dy = decimate(x, y, pixels, method)
+    assert len(dx) == len(dy) <= 2 * pixels + 2
+    assert dx[0] == x[0] and dx[-1] == x[-1]
+    assert np.all(np.isin(dx, x))
+
+    # Only the visible range plus one point on either side is decimated
+    x0, x1 = x[20000], x[30000]
+    dx, dy = decimate(x, y, pixels, method, x0, x1)
+    assert len(dx) <= 2 * pixels + 2
+    assert dx[0] == x[19999] and dx[-1] == x[30001]
+
+
+
+MINUTE_NS = 60 * 10**9
+T0 = 1704067200 * 10**9
+
+# Two streams over four one-minute columns; samples on the left edge of a
+# column belong to it, AU.B has nothing in columns 1 and 2 and AU.C has no
+# latency at all
+HEATMAP_SAMPLES = {
+    'AU.A..BHZ': ([0, 20, 59, 60, 100, 180], [1.0, 5.0, 3.0, -2.0, 4.0, 7.0]),
+    'AU.B..BHZ': ([30, 200, 239], [10.0, 6.0, 8.0]),
+}
+HEATMAP_EXPECTED = {
+    'mean': [[3.0, 1.0, np.nan, 7.0], [10.0, np.nan, np.nan, 7.0]],
+    'max': [[5.0, 4.0, np.nan, 7.0], [10.0, np.nan, np.nan, 8.0]],
+    'min': [[1.0, -2.0, np.nan, 7.0], [10.0, np.nan, np.nan, 6.0]],
+    'count': [[3, 2, 0, 1], [1, 0, 0, 2]],
+}
+
+
+def heatmap_store():
+    store = QCSeriesStore()
+    for key, (seconds, values) in HEATMAP_SAMPLES.items():
+        store.append(key, 'latency', T0 + np.array(seconds, dtype=np.int64) * 10**9, np.array(values))
+        store.append(key, 'delay', T0 + np.array(seconds, dtype=np.int64) * 10**9, np.zeros(len(values)))
+    store.append('AU.C..BHZ', 'delay', np.array([T0]), np.array([1.0]))
+    store.compact()
+    return store
+
+
+@pytest.mark.parametrize('aggregation', HEATMAP_AGGREGATIONS)
+def test_bin_heatmap_aggregations(aggregation):
+    stream_keys, start_ns, bucket_ns, matrix = bin_heatmap(heatmap_store(), 'latency', bucket_ns=MINUTE_NS,
+                                                           aggregation=aggregation)
+    assert stream_keys == ['AU.A..BHZ', 'AU.B..BHZ']
+    assert start_ns == T0 and bucket_ns == MINUTE_NS
+    np.testing.assert_array_equal(matrix, np.array(HEATMAP_EXPECTED[aggregation], dtype=np.float64))
+
+
+@pytest.mark.parametrize('aggregation', HEATMAP_AGGREGATIONS)
+def test_bin_heatmap_range(aggregation):
+    # An explicit range is widened to whole buckets; samples outside are dropped
+    _, start_ns, _, matrix = bin_heatmap(heatmap_store(), 'latency', bucket_ns=MINUTE_NS, aggregation=aggregation,
+                                         start_ns=T0 + 90 * 10**9, end_ns=T0 + 150 * 10**9)
+    assert start_ns == T0 + MINUTE_NS
+    np.testing.assert_array_equal(matrix, np.array(HEATMAP_EXPECTED[aggregation], dtype=np.float64)[:, 1:3])
+
+
+def test_bin_heatmap_missing_parameter():
+    stream_keys, _, _, matrix = bin_heatmap(heatmap_store(), 'rms', bucket_ns=MINUTE_NS)
+    assert stream_keys == [] and matrix.shape == (0, 0)
+
+
+def test_distribution_summary_matches_percentile():
+    rng = np.random.default_rng(42)
+    values = np.r_[rng.normal(50, 5, 2000), [0.0, 1.0, 120.0, 130.0, 140.0], [np.nan, np.inf]]
+    summary = distribution_summary(values, 'AU.A..BHZ', max_fliers=4)
+    finite = values[np.isfinite(values)]
+
+    q1, median, q3 = np.percentile(finite, [25, 50, 75])
+    assert (summary['q1'], summary['med'], summary['q3']) == (q1, median, q3)
+    assert summary['median'] == median
+    iqr = q3 - q1
+    inside = finite[(finite >= q1 - 1.5 * iqr) & (finite <= q3 + 1.5 * iqr)]
+    assert summary['whislo'] == inside.min() and summary['whishi'] == inside.max()
+    assert summary['whislo'] > 1.0 and summary['whishi'] < 120.0
+    assert summary['mean'] == pytest.approx(finite.mean())
+    assert (summary['min'], summary['max'], summary['count']) == (0.0, 140.0, len(finite))
+    assert summary['label'] == 'AU.A..BHZ'
+
+    # The two most extreme outliers on each side are kept
+    outliers = np.sort(finite[(finite < summary['whislo']) | (finite > summary['whishi'])])
+    assert len(outliers) > 4
+    np.testing.assert_array_equal(summary['fliers'], np.r_[outliers[:2], outliers[-2:]])
+
+
+def test_distribution_summary_small_inputs():
+    assert distribution_summary([], 'x') is None
+    assert distribution_summary([np.nan], 'x') is None
+    summary = distribution_summary([3.0], 'x')
+    assert summary['q1'] == summary['med'] == summary['q3'] == summary['whislo'] == summary['whishi'] == 3.0
+    assert len(summary['fliers']) == 0
+    assert np.all(summary['vals'] == 1)
+
+
+def test_binned_kde_density():
+    rng = np.random.default_rng(1)
+    values = rng.normal(0, 1, 20000)
+    coords, density = binned_kde(values, values.min(), values.max(), n_points=400)
+    assert len(coords) == len(density) == 400
+    assert coords[0] == values.min() and coords[-1] == values.max()
+    assert np.all(density >= 0)
+    assert np.sum(density) * (coords[1] - coords[0]) == pytest.approx(1, abs=0.02)
+    normal = np.exp(-0.5 * coords**2) / np.sqrt(2 * np.pi)
+    assert np.max(np.abs(density - normal)) < 0.03
+    assert abs(coords[np.argmax(density)]) < 0.2
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from qcrollup import DAY_NS, HOUR_NS, ROLLUP_RESOLUTIONS, choose_resolution, compute_rollup
+
+START_NS = 1704067200 * 10**9
+
+
+def sample_series(seed=0):
+    rng = np.random.default_rng(seed)
+    # Samples at random times and exactly on hour, 6-hour and day edges,
+    # with the third day left empty
+    times = np.r_[
+        START_NS + rng.integers(0, DAY_NS, 500),
+        START_NS + DAY_NS + rng.integers(0, 6 * HOUR_NS, 50),
+        START_NS + 3 * DAY_NS + rng.integers(0, DAY_NS, 200),
+        START_NS + np.arange(0, 4 * DAY_NS, HOUR_NS),
+        START_NS + np.array([DAY_NS - 1, 2 * DAY_NS - 1]),
+    ]
+    times = np.sort(times)
+    times = times[(times < START_NS + 2 * DAY_NS) | (times >= START_NS + 3 * DAY_NS)]
+    values = rng.normal(10, 3, len(times))
+    return times, values
+
+
+@pytest.mark.parametrize('resolution', ROLLUP_RESOLUTIONS)
+def test_compute_rollup_matches_groupby(resolution):
+    times, values = sample_series()
+    rollup = compute_rollup(times, values, resolution)
+
+    buckets = times // resolution
+    expected_times = np.unique(buckets) * resolution
+    assert np.array_equal(rollup.times, expected_times)
+    assert np.all(rollup.count > 0)
+    assert rollup.count.sum() == len(times)
+    for i, bucket_start in enumerate(expected_times):
+        members = values[(times >= bucket_start) & (times < bucket_start + resolution)]
+        assert rollup.count[i] == len(members)
+        assert rollup.minimum[i] == members.min()
+        assert rollup.maximum[i] == members.max()
+        assert rollup.total[i] / rollup.count[i] == pytest.approx(members.mean())
+        assert rollup.sumsq[i] == pytest.approx((members * members).sum())
+
+    # Empty buckets are left out rather than filled
+    all_buckets = np.arange(times[0] // resolution, times[-1] // resolution + 1) * resolution
+    empty = np.setdiff1d(all_buckets, rollup.times)
+    assert len(empty) >= 1
+    for bucket_start in empty:
+        assert not np.any((times >= bucket_start) & (times < bucket_start + resolution))
+
+
+def test_edges_start_a_bucket():
+    times = START_NS + np.array([0, HOUR_NS - 1, HOUR_NS, 2 * HOUR_NS, 6 * HOUR_NS - 1, 6 * HOUR_NS])
+    values = np.arange(6.0)
+    hourly = compute_rollup(times, values, HOUR_NS)
+    assert np.array_equal(hourly.times - START_NS, [0, HOUR_NS, 2 * HOUR_NS, 5 * HOUR_NS, 6 * HOUR_NS])
+    assert np.array_equal(hourly.count, [2, 1, 1, 1, 1])
+    six_hourly = compute_rollup(times, values, 6 * HOUR_NS)
+    assert np.array_equal(six_hourly.count, [5, 1])
+    assert np.array_equal(six_hourly.maximum, [4.0, 5.0])
+    daily = compute_rollup(times, values, DAY_NS)
+    assert np.array_equal(daily.count, [6])
+    assert daily.total[0] == values.sum()
+
+
+def test_compute_rollup_empty():
+    rollup = compute_rollup(np.empty(0, dtype=np.int64), np.empty(0), HOUR_NS)
+    assert all(len(column) == 0 for column in rollup)
+
+
+@pytest.mark.parametrize('span, pixels, resolution', [
+    (1000 * DAY_NS, 1000, DAY_NS),
+    (999 * DAY_NS, 1000, 6 * HOUR_NS),
+    (250 * DAY_NS, 1000, 6 * HOUR_NS),
+    (249 * DAY_NS, 1000, HOUR_NS),
+    (1000 * HOUR_NS, 1000, HOUR_NS),
+    (999 * HOUR_NS, 1000, None),
+])
+def test_choose_resolution(span, pixels, resolution):
+    assert choose_resolution(START_NS, START_NS + span, pixels) == resolution
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+import qcstats
+from qcstats import KLLSketch, RunningStats
+
+QS = np.linspace(0.01, 0.99, 99)
+
+
+def rank_error(sketch, data):
+    # Largest distance between the asked and the true rank of the answers
+    estimates = np.array(sketch.quantiles(QS))
+    ranks = np.searchsorted(np.sort(data), estimates, side='right') / len(data)
+    return float(np.abs(ranks - QS).max())
+
+
+def sketch_of(data, chunks=20, seed=0):
+    sketch = KLLSketch(rng=np.random.default_rng(seed))
+    for chunk in np.array_split(data, chunks):
+        sketch.update(chunk)
+    return sketch
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_rank_error_under_one_percent(seed):
+    data = np.random.default_rng(seed).lognormal(1.0, 0.8, 500000)
+    sketch = sketch_of(data, seed=seed)
+    assert sketch.count == len(data)
+    assert rank_error(sketch, data) < 0.01
+
+
+def test_small_input_is_exact():
+    data = np.random.default_rng(1).normal(size=300)
+    sketch = sketch_of(data)
+    assert sketch.quantiles([0.0, 1.0]) == [data.min(), data.max()]
+    assert rank_error(sketch, data) <= 1 / len(data)
+
+
+def test_empty_sketch():
+    assert KLLSketch().quantiles([0.5, 0.9]) == [None, None]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_merge_matches_union(seed):
+    generator = np.random.default_rng(seed)
+    parts = [generator.normal(loc, 1.0, size) for loc, size in [(0, 200000), (3, 50000), (-2, 120000)]]
+    merged = KLLSketch(rng=np.random.default_rng(seed))
+    for index, part in enumerate(parts):
+        merged.merge(sketch_of(part, seed=seed + index))
+    data = np.concatenate(parts)
+    assert merged.count == len(data)
+    assert rank_error(merged, data) < 0.01
+
+
+def test_seeded_sketches_repeat():
+    data = np.random.default_rng(2).exponential(size=100000)
+    assert sketch_of(data, seed=7).quantiles(QS) == sketch_of(data, seed=7).quantiles(QS)
+
+    results = []
+    for _ in range(2):
+        qcstats.seed(11)
+        sketch = KLLSketch()
+        sketch.update(data)
+        results.append(sketch.quantiles(QS))
+    qcstats.seed()
+    assert results[0] == results[1]
+
+
+def test_bytes_round_trip():
+    sketch = sketch_of(np.random.default_rng(3).normal(size=100000))
+    copy = KLLSketch.from_bytes(sketch.to_bytes())
+    assert copy.k == sketch.k
+    assert copy.count == sketch.count
+    assert copy.quantiles(QS) == sketch.quantiles(QS)
+
+
+def test_running_stats_merge():
+    generator = np.random.default_rng(4)
+    data = generator.normal(10, 2, 30000)
+    whole = RunningStats()
+    whole.update(data)
+    merged = RunningStats()
+    for chunk in np.array_split(data, 7):
+        part = RunningStats()
+        part.update(chunk)
+        merged.merge(part)
+    for stats in (whole, merged):
+        assert stats.count == len(data)
+        assert stats.average == pytest.approx(data.mean())
+        assert stats.std() == pytest.approx(data.std())
+        assert stats.minimum == data.min() and stats.maximum == data.max()